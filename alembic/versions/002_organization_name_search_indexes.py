@@ -0,0 +1,47 @@
+from typing import Sequence, Union
+from alembic import op
+
+from app.search import SQLITE_FTS_DDL, SQLITE_FTS_REBUILD
+
+# revision identifiers, used by Alembic.
+revision: str = '002'
+down_revision: Union[str, None] = '001'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+
+    if bind.dialect.name == 'postgresql':
+        # Триграммный индекс обслуживает name ILIKE '%...%'
+        op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        op.execute(
+            'CREATE INDEX IF NOT EXISTS ix_organizations_name_trgm '
+            'ON organizations USING gin (name gin_trgm_ops)'
+        )
+        # Полнотекстовый индекс для поиска с ранжированием по релевантности
+        op.execute(
+            'CREATE INDEX IF NOT EXISTS ix_organizations_name_tsv '
+            "ON organizations USING gin (to_tsvector('simple'::regconfig, name))"
+        )
+
+    elif bind.dialect.name == 'sqlite':
+        # Локальная разработка: внешний индекс FTS5 с триграммным токенизатором (DDL общий с app.search)
+        for statement in SQLITE_FTS_DDL:
+            op.execute(statement)
+        op.execute(SQLITE_FTS_REBUILD)
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+
+    if bind.dialect.name == 'postgresql':
+        op.execute('DROP INDEX IF EXISTS ix_organizations_name_tsv')
+        op.execute('DROP INDEX IF EXISTS ix_organizations_name_trgm')
+
+    elif bind.dialect.name == 'sqlite':
+        op.execute('DROP TRIGGER IF EXISTS organizations_fts_au')
+        op.execute('DROP TRIGGER IF EXISTS organizations_fts_ad')
+        op.execute('DROP TRIGGER IF EXISTS organizations_fts_ai')
+        op.execute('DROP TABLE IF EXISTS organizations_fts')
@@ -0,0 +1,33 @@
+
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = '003'
+down_revision: Union[str, None] = '002'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Таблица API ключей клиентов: хранится только SHA-256 ключа
+    op.create_table('api_keys',
+                    sa.Column('id', sa.Integer(), nullable=False),
+                    sa.Column('name', sa.String(), nullable=False),
+                    sa.Column('key_hash', sa.String(length=64), nullable=False),
+                    sa.Column('scopes', postgresql.ARRAY(sa.String()).with_variant(sa.JSON(), 'sqlite'),
+                              nullable=False),
+                    sa.Column('enabled', sa.Boolean(), nullable=False, server_default=sa.true()),
+                    sa.Column('created_at', sa.DateTime(), nullable=False, server_default=sa.func.now()),
+                    sa.PrimaryKeyConstraint('id')
+                    )
+    op.create_index('ix_api_keys_id', 'api_keys', ['id'], unique=False)
+    op.create_index('ix_api_keys_key_hash', 'api_keys', ['key_hash'], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_api_keys_key_hash', table_name='api_keys')
+    op.drop_index('ix_api_keys_id', table_name='api_keys')
+    op.drop_table('api_keys')
@@ -0,0 +1,104 @@
+from sqlalchemy.orm import Session
+from typing import Dict, FrozenSet, List, Optional
+from . import models
+from .watermark import IdWatermark, RefreshGate
+import os
+import threading
+
+# Как часто подгружать деятельности, созданные другими процессами (секунды)
+REFRESH_INTERVAL = float(os.getenv("ACTIVITY_TREE_REFRESH_SECONDS", "30"))
+
+
+class ActivityClosure:
+    """Замыкание дерева деятельности в памяти процесса: activity_id -> frozenset ID поддерева.
+
+    Поддерево включает саму деятельность. Деятельности только добавляются,
+    поэтому структура строится один раз из таблицы activities, пополняется
+    при create_activity и периодически догружает строки, созданные другими
+    процессами (граница по id - IdWatermark, её сдвигают только строки из БД).
+    Счетчик version растет при каждом изменении.
+    """
+
+    def __init__(self):
+        self._parents: Dict[int, Optional[int]] = {}
+        self._levels: Dict[int, int] = {}
+        self._descendants: Dict[int, FrozenSet[int]] = {}
+        self._lock = threading.RLock()
+        self._watermark = IdWatermark()
+        self._refresh = RefreshGate(REFRESH_INTERVAL)
+        self.version = 0
+        self.ready = False
+
+    def __len__(self):
+        return len(self._parents)
+
+    def rebuild(self, db: Session):
+        """Полностью перестраивает замыкание по таблице activities"""
+        with self._lock:
+            self._parents = {}
+            self._levels = {}
+            self._descendants = {}
+            self._watermark.reset()
+            self._sync(db)
+            self.ready = True
+
+    def refresh_if_stale(self, db: Session):
+        """Догружает деятельности, появившиеся после последней синхронизации"""
+        if not self.ready or not self._refresh.begin():
+            return
+        try:
+            with self._lock:
+                self._sync(db)
+        finally:
+            self._refresh.end()
+
+    def _sync(self, db: Session):
+        rows = db.query(
+            models.Activity.id, models.Activity.parent_id, models.Activity.level
+        ).filter(self._watermark.condition(models.Activity.id)).order_by(models.Activity.id).all()
+        for activity_id, parent_id, level in rows:
+            self.add(activity_id, parent_id, level)
+        self._watermark.advance(activity_id for activity_id, _, _ in rows)
+        self._refresh.synced()
+
+    def add(self, activity_id: int, parent_id: Optional[int], level: Optional[int]):
+        """Добавляет деятельность и дописывает её во все поддеревья предков"""
+        with self._lock:
+            if activity_id in self._parents:
+                return
+            self._parents[activity_id] = parent_id
+            self._levels[activity_id] = level or 1
+            # Потомки, пришедшие раньше родителя (не по порядку id), уже записаны в его поддерево
+            subtree = self._descendants.get(activity_id, frozenset()) | {activity_id}
+            self._descendants[activity_id] = subtree
+
+            ancestor = parent_id
+            seen = set()
+            while ancestor is not None and ancestor not in seen:
+                seen.add(ancestor)
+                self._descendants[ancestor] = self._descendants.get(ancestor, frozenset((ancestor,))) | subtree
+                ancestor = self._parents.get(ancestor)
+            self.version += 1
+
+    def descendants(self, activity_id: int) -> Optional[FrozenSet[int]]:
+        """ID поддерева деятельности или None, если деятельность неизвестна"""
+        if activity_id not in self._parents:
+            return None
+        return self._descendants[activity_id]
+
+    def level(self, activity_id: int) -> Optional[int]:
+        return self._levels.get(activity_id)
+
+    def ancestors(self, activity_id: int) -> Optional[List[int]]:
+        """Деятельность и все её предки или None, если деятельность неизвестна"""
+        if activity_id not in self._parents:
+            return None
+        chain = [activity_id]
+        parent_id = self._parents[activity_id]
+        while parent_id is not None and parent_id not in chain:
+            chain.append(parent_id)
+            parent_id = self._parents.get(parent_id)
+        return chain
+
+
+activity_closure = ActivityClosure()
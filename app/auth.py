@@ -1,17 +1,159 @@
 from fastapi import HTTPException, status, Depends
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from collections import OrderedDict
+from typing import NamedTuple, Optional, Tuple
+from . import crud
+from .database import run_db
+from .dependencies import open_db
+import hashlib
+import hmac
 import os
+import secrets
+import threading
+import time
 
 security = HTTPBearer()
 
-# Статический API ключ
+# Статический API ключ со всеми правами (пустое значение отключает его)
 API_KEY = os.getenv("API_KEY", "your-secret-api-key-here")
+# Сколько секунд помнить результат проверки ключа из БД: отзыв ключа
+# в других процессах вступает в силу не позже чем через это время
+API_KEY_CACHE_TTL = float(os.getenv("API_KEY_CACHE_TTL", "30"))
+API_KEY_CACHE_MAX_ENTRIES = int(os.getenv("API_KEY_CACHE_MAX_ENTRIES", "10000"))
+# Отдельный лимит для неизвестных ключей: поток случайных токенов не вытесняет настоящие ключи
+API_KEY_NEGATIVE_CACHE_MAX_ENTRIES = int(os.getenv("API_KEY_NEGATIVE_CACHE_MAX_ENTRIES", "1000"))
 
-async def verify_api_key(credentials: HTTPAuthorizationCredentials = Depends(security)):
-    if credentials.credentials != API_KEY:
+ALL_SCOPES = frozenset(("read", "write", "admin"))
+
+
+class ApiKeyInfo(NamedTuple):
+    id: Optional[int]
+    name: str
+    scopes: frozenset
+
+
+def hash_api_key(key: str) -> str:
+    """SHA-256 ключа: ключи случайные и длинные, поэтому соль не нужна"""
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+def generate_api_key() -> str:
+    return secrets.token_urlsafe(32)
+
+
+STATIC_KEY_HASH = hash_api_key(API_KEY) if API_KEY else None
+STATIC_KEY_INFO = ApiKeyInfo(id=None, name="static", scopes=ALL_SCOPES)
+
+
+class ApiKeyCache:
+    """LRU-кэш проверенных ключей с TTL: хэш ключа -> ApiKeyInfo или None (ключ не найден или отключен).
+
+    Действующие и недействительные ключи хранятся в разных LRU: неверные
+    токены вытесняют только друг друга, а не записи настоящих клиентов.
+    """
+
+    def __init__(self, max_entries: int = API_KEY_CACHE_MAX_ENTRIES, ttl: float = API_KEY_CACHE_TTL,
+                 max_negative_entries: int = API_KEY_NEGATIVE_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.max_negative_entries = max_negative_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[float, ApiKeyInfo]]" = OrderedDict()
+        self._negative: "OrderedDict[str, float]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key_hash: str) -> Tuple[bool, Optional[ApiKeyInfo]]:
+        """(найдено ли в кэше, результат проверки)"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key_hash)
+            if entry is not None:
+                if entry[0] >= now:
+                    self._entries.move_to_end(key_hash)
+                    return True, entry[1]
+                del self._entries[key_hash]
+            expires_at = self._negative.get(key_hash)
+            if expires_at is not None:
+                if expires_at >= now:
+                    self._negative.move_to_end(key_hash)
+                    return True, None
+                del self._negative[key_hash]
+            return False, None
+
+    def set(self, key_hash: str, info: Optional[ApiKeyInfo]):
+        expires_at = time.monotonic() + self.ttl
+        with self._lock:
+            if info is None:
+                self._entries.pop(key_hash, None)
+                self._store(self._negative, key_hash, expires_at, self.max_negative_entries)
+            else:
+                self._negative.pop(key_hash, None)
+                self._store(self._entries, key_hash, (expires_at, info), self.max_entries)
+
+    @staticmethod
+    def _store(entries: OrderedDict, key_hash: str, value, max_entries: int):
+        entries[key_hash] = value
+        entries.move_to_end(key_hash)
+        while len(entries) > max_entries:
+            entries.popitem(last=False)
+
+    def invalidate(self, key_hash: str):
+        with self._lock:
+            self._entries.pop(key_hash, None)
+            self._negative.pop(key_hash, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._negative.clear()
+
+
+api_key_cache = ApiKeyCache()
+
+
+def _load_api_key(db, key_hash: str) -> Optional[ApiKeyInfo]:
+    api_key = crud.get_api_key_by_hash(db, key_hash)
+    # Индекс ищет по равенству хэша, итоговое сравнение - за постоянное время
+    if api_key is None or not api_key.enabled or not hmac.compare_digest(api_key.key_hash, key_hash):
+        return None
+    return ApiKeyInfo(id=api_key.id, name=api_key.name, scopes=frozenset(api_key.scopes))
+
+
+async def authenticate(credentials: HTTPAuthorizationCredentials = Depends(security)) -> ApiKeyInfo:
+    """Проверяет ключ: статический API_KEY, затем кэш, затем таблица api_keys.
+
+    Сессия открывается только при промахе кэша и закрывается сразу, чтобы
+    потоковые ответы не держали соединение до конца выдачи.
+    """
+    key_hash = hash_api_key(credentials.credentials)
+    if STATIC_KEY_HASH is not None and hmac.compare_digest(key_hash, STATIC_KEY_HASH):
+        return STATIC_KEY_INFO
+
+    found, info = api_key_cache.get(key_hash)
+    if not found:
+        async with open_db() as db:
+            info = await run_db(db, _load_api_key, key_hash)
+        api_key_cache.set(key_hash, info)
+    if info is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid API key",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    return credentials.credentials
\ No newline at end of file
+    return info
+
+
+def require_scope(scope: str):
+    """Зависимость: валидный ключ с правом scope"""
+    async def dependency(api_key: ApiKeyInfo = Depends(authenticate)) -> ApiKeyInfo:
+        if scope not in api_key.scopes:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail=f"API key lacks '{scope}' scope",
+            )
+        return api_key
+    return dependency
+
+
+verify_api_key = require_scope("read")
+verify_write_api_key = require_scope("write")
+verify_admin_api_key = require_scope("admin")
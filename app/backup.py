@@ -0,0 +1,286 @@
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from fastapi import HTTPException, Request
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
+from sqlalchemy import func, select
+from typing import AsyncIterator, Dict, Iterable, Iterator, Tuple
+from . import crud, models, schemas
+from .bulk import BULK_CHUNK_SIZE, validation_message
+from .crud import STREAM_BATCH_SIZE
+from .database import DbSession, engine, run_db
+from .serialization import dumps
+import json
+import os
+import zlib
+
+EXPORT_FORMAT = "organizations-export"
+EXPORT_FORMAT_VERSION = 1
+EXPORT_MEDIA_TYPE = "application/gzip"
+# Уровень сжатия gzip выгрузки: 1 - быстрее, 9 - меньше
+EXPORT_GZIP_LEVEL = int(os.getenv("EXPORT_GZIP_LEVEL", "6"))
+# Сколько строк выгрузки сжимать и отдавать клиенту за раз
+EXPORT_CHUNK_LINES = 1000
+# wbits для zlib: формат gzip (заголовок и CRC32)
+GZIP_WBITS = 31
+GZIP_MAGIC = b"\x1f\x8b"
+# Максимум распакованных байт за шаг при восстановлении: маленький сжатый кусок
+# может распаковаться в гигабайты, поэтому он распаковывается частями
+RESTORE_READ_SIZE = 1 << 20
+
+# Записи выгрузки в порядке восстановления: таблица, колонки и счетчик в итогах
+RECORD_TABLES = {
+    "building": (models.Building.__table__, ("id", "address", "latitude", "longitude"), "buildings"),
+    "activity": (models.Activity.__table__, ("id", "name", "parent_id", "level"), "activities"),
+    "organization": (models.Organization.__table__, ("id", "name", "phone_numbers", "building_id"), "organizations"),
+}
+COUNTERS = ("buildings", "activities", "organizations", "organization_activities")
+# Схемы, по которым проверяются записи при восстановлении (те же, что при создании через API)
+RECORD_SCHEMAS = {
+    "building": schemas.BuildingCreate,
+    "activity": schemas.ActivityCreate,
+    "organization": schemas.OrganizationCreate,
+}
+
+
+@contextmanager
+def snapshot_connection(db_engine=engine):
+    """Соединение с одной транзакцией только для чтения: вся выгрузка видит один снимок данных"""
+    if db_engine.dialect.name == "postgresql":
+        with db_engine.connect() as connection:
+            connection.execution_options(isolation_level="REPEATABLE READ", postgresql_readonly=True)
+            with connection.begin():
+                yield connection
+    elif db_engine.dialect.name == "sqlite":
+        # pysqlite сам начинает транзакцию только перед записью, поэтому BEGIN выполняется явно
+        with db_engine.connect() as connection:
+            connection.execution_options(isolation_level="AUTOCOMMIT")
+            connection.exec_driver_sql("BEGIN")
+            try:
+                yield connection
+            finally:
+                connection.exec_driver_sql("ROLLBACK")
+    else:
+        with db_engine.connect() as connection, connection.begin():
+            yield connection
+
+
+def iter_export_records(connection, batch_size: int = STREAM_BATCH_SIZE) -> Iterator[dict]:
+    """Записи выгрузки: заголовок, здания, деятельности, организации и итоговая запись с количествами.
+
+    Таблицы читаются серверным курсором (yield_per). Деятельности идут по уровням,
+    чтобы родитель восстанавливался раньше дочерних; связи организаций
+    с деятельностями догружаются одним запросом на пачку организаций.
+    """
+    counts = dict.fromkeys(COUNTERS, 0)
+    yield {
+        "type": "header",
+        "format": EXPORT_FORMAT,
+        "version": EXPORT_FORMAT_VERSION,
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+    }
+
+    order_by = {
+        "building": (models.Building.id,),
+        "activity": (func.coalesce(models.Activity.level, 1), models.Activity.id),
+        "organization": (models.Organization.id,),
+    }
+    links = models.organization_activity.c
+    for kind, (table, columns, counter) in RECORD_TABLES.items():
+        statement = select(*(table.c[name] for name in columns)).order_by(*order_by[kind])
+        result = connection.execute(statement.execution_options(yield_per=batch_size))
+        for partition in result.partitions():
+            activity_ids: Dict[int, list] = {}
+            if kind == "organization":
+                # Пачка содержит все организации своего диапазона id, поэтому связи выбираются по диапазону
+                for organization_id, activity_id in connection.execute(
+                    select(links.organization_id, links.activity_id)
+                    .where(links.organization_id.between(partition[0].id, partition[-1].id))
+                    .order_by(links.organization_id, links.activity_id)
+                ):
+                    activity_ids.setdefault(organization_id, []).append(activity_id)
+            for row in partition:
+                record = {"type": kind, **dict(zip(columns, row))}
+                if kind == "organization":
+                    record["activity_ids"] = activity_ids.get(row.id, [])
+                    counts["organization_activities"] += len(record["activity_ids"])
+                counts[counter] += 1
+                yield record
+
+    yield {"type": "end", "counts": counts}
+
+
+def gzip_ndjson(records: Iterable[dict]) -> Iterator[bytes]:
+    """Сжимает записи в gzip NDJSON по мере поступления, не накапливая весь файл"""
+    compressor = zlib.compressobj(EXPORT_GZIP_LEVEL, zlib.DEFLATED, GZIP_WBITS)
+    lines = []
+    for record in records:
+        lines.append(dumps(record))
+        if len(lines) >= EXPORT_CHUNK_LINES:
+            data = compressor.compress(b"\n".join(lines) + b"\n")
+            lines = []
+            if data:
+                yield data
+    tail = compressor.compress(b"\n".join(lines) + b"\n") if lines else b""
+    yield tail + compressor.flush()
+
+
+def export_response() -> StreamingResponse:
+    """Выгрузка всего справочника в gzip NDJSON из одной транзакции-снимка.
+
+    Генератор работает в пуле потоков со своим синхронным соединением,
+    в памяти держится только текущая пачка строк.
+    """
+    def generate():
+        with snapshot_connection() as connection:
+            yield from gzip_ndjson(iter_export_records(connection))
+
+    filename = f"export_{datetime.now().strftime('%Y%m%d_%H%M%S')}.ndjson.gz"
+    return StreamingResponse(
+        generate(), media_type=EXPORT_MEDIA_TYPE,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+
+async def _iter_body(request: Request) -> AsyncIterator[bytes]:
+    """Тело запроса, распакованное потоково, если оно в gzip (определяется по сигнатуре)"""
+    decompressor = None
+    started = False
+    async for chunk in request.stream():
+        if not chunk:
+            continue
+        if not started:
+            started = True
+            if chunk.startswith(GZIP_MAGIC):
+                decompressor = zlib.decompressobj(GZIP_WBITS)
+        if decompressor is None:
+            yield chunk
+            continue
+        while chunk:
+            data = decompressor.decompress(chunk, RESTORE_READ_SIZE)
+            if data:
+                yield data
+            if decompressor.eof:
+                # Склеенные gzip-файлы (cat a.gz b.gz): следующий член начинается в unused_data
+                chunk = decompressor.unused_data
+                decompressor = zlib.decompressobj(GZIP_WBITS)
+            else:
+                chunk = decompressor.unconsumed_tail
+    if decompressor is not None:
+        data = decompressor.flush()
+        if data:
+            yield data
+
+
+async def _iter_records(request: Request) -> AsyncIterator[Tuple[int, dict]]:
+    """Номер строки и запись выгрузки; нераспознанная строка отдается как ValueError"""
+    number = 0
+    buffer = b""
+    async for data in _iter_body(request):
+        buffer += data
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            number += 1
+            if line.strip():
+                yield number, _parse_record(line)
+    if buffer.strip():
+        yield number + 1, _parse_record(buffer)
+
+
+def _parse_record(line: bytes):
+    try:
+        record = json.loads(line)
+    except ValueError as exc:
+        return ValueError(f"некорректный JSON: {exc}")
+    if not isinstance(record, dict):
+        return ValueError("запись должна быть JSON-объектом")
+    return record
+
+
+async def restore_export(request: Request, db: DbSession) -> schemas.RestoreResult:
+    """Загружает выгрузку /export (gzip или несжатый NDJSON) в пустую базу.
+
+    Тело читается потоково, каждая запись проверяется схемой создания
+    (RECORD_SCHEMAS), записи вставляются пачками по BULK_CHUNK_SIZE с
+    исходными id, каждая пачка - в своей транзакции, поэтому память не зависит
+    от размера выгрузки. При ошибке уже загруженные пачки остаются в базе.
+    Индексы в памяти и кэш ответов обновляются только в этом процессе.
+    """
+    if not await run_db(db, crud.directory_is_empty):
+        raise HTTPException(status_code=409, detail="Восстановление возможно только в пустую базу")
+
+    counts = dict.fromkeys(COUNTERS, 0)
+    chunk_kind = None
+    rows, links = [], []
+    header = footer = None
+
+    def fail(number: int, message: str):
+        loaded = ", ".join(f"{name}: {count}" for name, count in counts.items())
+        raise HTTPException(status_code=400, detail=f"Строка {number}: {message} (уже загружено - {loaded})")
+
+    async def flush(number: int):
+        table, _, counter = RECORD_TABLES[chunk_kind]
+        error = await run_db(db, crud.restore_rows, table, rows, links)
+        if error is not None:
+            fail(number, f"ошибка записи пачки {counter}: {error}")
+        counts[counter] += len(rows)
+        counts["organization_activities"] += len(links)
+        rows.clear()
+        links.clear()
+
+    number = 0
+    try:
+        async for number, record in _iter_records(request):
+            if isinstance(record, Exception):
+                fail(number, str(record))
+            kind = record.get("type")
+            if header is None:
+                if kind != "header" or record.get("format") != EXPORT_FORMAT:
+                    fail(number, "файл не является выгрузкой /export")
+                if record.get("version") != EXPORT_FORMAT_VERSION:
+                    fail(number, f"неподдерживаемая версия формата {record.get('version')}")
+                header = record
+                continue
+            if footer is not None:
+                fail(number, "данные после завершающей записи")
+            if kind == "end":
+                footer = record
+                continue
+            if kind not in RECORD_TABLES:
+                fail(number, f"неизвестный тип записи {kind!r}")
+
+            if rows and kind != chunk_kind:
+                await flush(number)
+            chunk_kind = kind
+            record_id = record.get("id")
+            if type(record_id) is not int or record_id < 1:
+                fail(number, f"в записи {kind} некорректный id {record_id!r}")
+            try:
+                values = RECORD_SCHEMAS[kind].model_validate(record).model_dump()
+            except ValidationError as exc:
+                fail(number, f"некорректная запись {kind}: {validation_message(exc)}")
+            if kind == "organization":
+                links.extend(
+                    {"organization_id": record_id, "activity_id": activity_id}
+                    for activity_id in sorted(set(values.pop("activity_ids")))
+                )
+            rows.append({"id": record_id, **values})
+            if len(rows) >= BULK_CHUNK_SIZE:
+                await flush(number)
+
+        if rows:
+            await flush(number)
+        if header is None:
+            fail(number, "пустая выгрузка")
+        if footer is None:
+            fail(number, "выгрузка оборвана: нет завершающей записи")
+        if footer.get("counts") != counts:
+            fail(number, f"количества не совпадают с итогами выгрузки {footer.get('counts')}")
+    except zlib.error as exc:
+        fail(number, f"поврежденный gzip: {exc}")
+    finally:
+        # Индексы в памяти и кэш должны соответствовать базе и после частичной загрузки
+        if any(counts.values()):
+            await run_db(db, crud.finish_restore)
+
+    return schemas.RestoreResult(**counts)
@@ -0,0 +1,93 @@
+from fastapi import HTTPException, Request
+from pydantic import ValidationError
+from typing import AsyncIterator, Tuple
+from . import schemas
+from .database import DbSession, run_db
+from .streaming import NDJSON_MEDIA_TYPE
+import json
+import os
+
+# Сколько элементов вставляется в одной транзакции
+BULK_CHUNK_SIZE = int(os.getenv("BULK_CHUNK_SIZE", "1000"))
+
+
+async def iter_bulk_items(request: Request) -> AsyncIterator[Tuple[int, object]]:
+    """Элементы тела запроса: JSON-массив или NDJSON (Content-Type: application/x-ndjson).
+
+    NDJSON читается потоково по строкам; строка, которую не удалось разобрать,
+    отдается как исключение ValueError вместо элемента.
+    """
+    if request.headers.get("content-type", "").startswith(NDJSON_MEDIA_TYPE):
+        index = 0
+        buffer = b""
+        async for chunk in request.stream():
+            buffer += chunk
+            *lines, buffer = buffer.split(b"\n")
+            for line in lines:
+                if line.strip():
+                    yield index, _parse_line(line)
+                    index += 1
+        if buffer.strip():
+            yield index, _parse_line(buffer)
+        return
+
+    try:
+        items = json.loads(await request.body())
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Тело запроса должно быть JSON-массивом или NDJSON")
+    if not isinstance(items, list):
+        raise HTTPException(status_code=400, detail="Тело запроса должно быть JSON-массивом или NDJSON")
+    for index, item in enumerate(items):
+        yield index, item
+
+
+def _parse_line(line: bytes):
+    try:
+        return json.loads(line)
+    except ValueError as exc:
+        return ValueError(f"Некорректный JSON: {exc}")
+
+
+async def run_bulk(request: Request, db: DbSession, item_schema, bulk_create) -> schemas.BulkResult:
+    """Валидирует элементы по одному и вставляет их пачками по BULK_CHUNK_SIZE.
+
+    Ошибка валидации или записи одного элемента попадает в errors и не
+    прерывает загрузку остальных (пачку, отклоненную БД, crud повторяет
+    по одному элементу).
+    """
+    ids = []
+    errors = []
+    chunk = []
+
+    async def flush():
+        results = await run_db(db, bulk_create, [item for _, item in chunk])
+        for (index, _), result in zip(chunk, results):
+            if isinstance(result, int):
+                ids[index] = result
+            else:
+                errors.append(schemas.BulkError(index=index, detail=result))
+        chunk.clear()
+
+    async for index, raw in iter_bulk_items(request):
+        ids.append(None)
+        if isinstance(raw, Exception):
+            errors.append(schemas.BulkError(index=index, detail=str(raw)))
+            continue
+        try:
+            chunk.append((index, item_schema.model_validate(raw)))
+        except ValidationError as exc:
+            errors.append(schemas.BulkError(index=index, detail=validation_message(exc)))
+            continue
+        if len(chunk) >= BULK_CHUNK_SIZE:
+            await flush()
+    if chunk:
+        await flush()
+
+    errors.sort(key=lambda error: error.index)
+    return schemas.BulkResult(created=sum(1 for item_id in ids if item_id is not None), ids=ids, errors=errors)
+
+
+def validation_message(exc: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(part) for part in error['loc']) or 'item'}: {error['msg']}" for error in exc.errors()
+    )
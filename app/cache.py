@@ -0,0 +1,153 @@
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, Optional, Set, Tuple
+import os
+import threading
+import time
+
+CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+CACHE_TTL_SECONDS = float(os.getenv("RESPONSE_CACHE_TTL", "60"))
+CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "10000"))
+
+
+class CacheBackend(ABC):
+    """Интерфейс хранилища сериализованных ответов.
+
+    Записи помечаются тегами; запись данных инвалидирует теги, и все
+    ответы с этими тегами удаляются. Для общего кэша нескольких процессов
+    (например, Redis) достаточно реализовать эти методы и передать
+    экземпляр в set_cache_backend.
+    """
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[bytes]:
+        ...
+
+    @abstractmethod
+    def set(self, key: str, value: bytes, tags: Iterable[str] = ()):
+        ...
+
+    @abstractmethod
+    def invalidate(self, tags: Iterable[str]):
+        ...
+
+    @abstractmethod
+    def clear(self):
+        ...
+
+
+class InMemoryCache(CacheBackend):
+    """LRU-кэш с TTL в памяти процесса.
+
+    Инвалидация действует только в текущем процессе; в других воркерах
+    устаревшая запись живет не дольше TTL.
+    """
+
+    def __init__(self, max_entries: int = CACHE_MAX_ENTRIES, ttl: float = CACHE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[float, bytes, Tuple[str, ...]]]" = OrderedDict()
+        self._tags: Dict[str, Set[str]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    self._remove(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key: str, value: bytes, tags: Iterable[str] = ()):
+        tags = tuple(tags)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + self.ttl, value, tags)
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate(self, tags: Iterable[str]):
+        with self._lock:
+            for tag in tags:
+                for key in self._tags.pop(tag, ()):
+                    self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._tags.clear()
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for tag in entry[2]:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+
+class NullCache(CacheBackend):
+    """Кэш отключен"""
+
+    def get(self, key: str) -> Optional[bytes]:
+        return None
+
+    def set(self, key: str, value: bytes, tags: Iterable[str] = ()):
+        pass
+
+    def invalidate(self, tags: Iterable[str]):
+        pass
+
+    def clear(self):
+        pass
+
+
+response_cache: CacheBackend = InMemoryCache() if CACHE_ENABLED else NullCache()
+
+
+def set_cache_backend(backend: CacheBackend):
+    global response_cache
+    response_cache = backend
+
+
+def get_cache() -> CacheBackend:
+    return response_cache
+
+
+def make_cache_key(fn: Callable, args: tuple) -> str:
+    """Ключ кэша: crud-функция и её аргументы.
+
+    Аргументы - уже проверенные параметры маршрута с подставленными
+    значениями по умолчанию, поэтому необъявленные параметры запроса и
+    явно переданные значения по умолчанию не создают новых записей.
+    """
+    return f"{fn.__module__}.{fn.__qualname__}{args!r}"
+
+
+def organization_tags(organizations) -> Set[str]:
+    """Теги всех деятельностей, вложенных в ответ (включая дочерние).
+
+    В компактном представлении деятельностей нет, и тегов тоже нет.
+    """
+    tags = set()
+    stack = [activity for org in organizations for activity in getattr(org, "activities", ())]
+    while stack:
+        activity = stack.pop()
+        tags.add(f"activity:{activity.id}")
+        stack.extend(activity.children)
+    return tags
@@ -1,73 +1,333 @@
-from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import func, and_, or_
-from typing import List, Optional
-from . import models, schemas
+from sqlalchemy.orm import Session, joinedload, selectinload
+from sqlalchemy import and_, or_, select, insert, text
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from typing import Callable, List, Optional, Sequence, Set, Tuple, Union
+from . import models, schemas, search
+from .activity_tree import activity_closure
+from .cache import get_cache
+from .versions import data_versions
+from .geo_index import building_index
+from .pagination import DEFAULT_PAGE_SIZE, decode_cursor, make_page
+import heapq
+import logging
 import math
+import os
+
+try:
+    import numpy as np
+except ImportError:  # NumPy необязателен, без него расстояния считаются поштучно
+    np = None
+
+EARTH_RADIUS_KM = 6371  # Радиус Земли в км
+# Запас (в радианах), чтобы погрешность округления на границе не отсекала точки
+BOUNDING_BOX_MARGIN = 1e-9
+# Максимум зданий-кандидатов из индекса, при котором выгоднее запрос по их id
+GEO_INDEX_MAX_CANDIDATES = int(os.getenv("GEO_INDEX_MAX_CANDIDATES", "5000"))
+# С какого размера набора точек расстояния считаются векторно
+VECTORIZE_MIN_SIZE = 16
+# Максимальная глубина дерева деятельности
+MAX_ACTIVITY_LEVEL = 3
+# Представления организаций в ответах
+FULL_VIEW = "full"
+COMPACT_VIEW = "compact"
+# Размер пачки при потоковой выдаче больших выборок
+STREAM_BATCH_SIZE = int(os.getenv("STREAM_BATCH_SIZE", "1000"))
+
+logger = logging.getLogger("app.crud")
+
+
+def organization_load_options():
+    """Загрузка всего, что сериализует schemas.Organization, фиксированным числом запросов.
+
+    Здание присоединяется JOIN (многие-к-одному не размножает строки),
+    деятельности и их дочерние деятельности до максимальной глубины дерева
+    догружаются selectinload - по одному запросу на уровень, без ленивых
+    загрузок Activity.children во время валидации ответа.
+    """
+    children = selectinload(models.Organization.activities)
+    # Деятельность верхнего уровня + её дочерние на каждом из уровней ниже (листья - пустые списки)
+    for _ in range(MAX_ACTIVITY_LEVEL):
+        children = children.selectinload(models.Activity.children)
+    return joinedload(models.Organization.building), children
+
+
+def _select_view(query, view: str, *extra_columns):
+    """Полные организации со связями или только колонки компактного представления.
+
+    Компактное представление (schemas.OrganizationCompact) выбирает id, название
+    и координаты здания одним JOIN, без загрузки деятельностей.
+    """
+    if view == COMPACT_VIEW:
+        return query.with_entities(
+            models.Organization.id,
+            models.Organization.name,
+            models.Organization.building_id,
+            models.Building.latitude,
+            models.Building.longitude,
+            *extra_columns
+        ).join(models.Building, models.Organization.building_id == models.Building.id)
+    return query.options(*organization_load_options())
+
+
+def _organizations_page(query, cursor: Optional[str], limit: int, view: str = FULL_VIEW):
+    """Страница организаций с keyset-пагинацией по id"""
+    after = decode_cursor(cursor, (int,))
+    if after is not None:
+        query = query.filter(models.Organization.id > after[0])
+
+    organizations = _select_view(query, view).order_by(models.Organization.id).limit(limit + 1).all()
+
+    organizations, next_cursor = make_page(organizations, limit, lambda org: (org.id,))
+    return {"organizations": organizations, "next_cursor": next_cursor}
+
+
+def _get_organizations_by_ids(db: Session, organization_ids: List[int], view: str = FULL_VIEW):
+    """Организации по списку id в порядке этого списка"""
+    if not organization_ids:
+        return []
+    organizations = _select_view(db.query(models.Organization).filter(
+        models.Organization.id.in_(organization_ids)
+    ), view).all()
+    by_id = {org.id: org for org in organizations}
+    return [by_id[org_id] for org_id in organization_ids if org_id in by_id]
+
+
+def iter_organizations(query, batch_size: int = STREAM_BATCH_SIZE, view: str = FULL_VIEW):
+    """Все организации запроса в порядке id через серверный курсор (yield_per)"""
+    # Все загрузчики коллекций - selectinload, поэтому совместимы с yield_per и выполняются на каждую пачку
+    return _select_view(query, view).order_by(models.Organization.id).yield_per(batch_size)
+
+
+def iter_organizations_by_ids(db: Session, organization_ids: List[int], batch_size: int = STREAM_BATCH_SIZE,
+                              view: str = FULL_VIEW):
+    """Организации по списку id в порядке списка, пачками по batch_size"""
+    for start in range(0, len(organization_ids), batch_size):
+        yield from _get_organizations_by_ids(db, organization_ids[start:start + batch_size], view)
+
+
+def iter_organizations_in_radius(db: Session, latitude: float, longitude: float, radius_km: float,
+                                 view: str = FULL_VIEW):
+    """Все организации в радиусе по возрастанию (distance, id).
+
+    Для сортировки в памяти держатся пары (distance, id) всех организаций круга
+    (десятки байт на организацию), сами организации загружаются пачками по
+    STREAM_BATCH_SIZE.
+    """
+    ranked = rank_organizations_in_radius(db, latitude, longitude, radius_km)
+    ranked.sort()
+    organization_ids = [org_id for _, org_id in ranked]
+    del ranked
+    return iter_organizations_by_ids(db, organization_ids, view=view)
+
+
+def organizations_by_building_query(db: Session, building_id: int):
+    return db.query(models.Organization).filter(models.Organization.building_id == building_id)
 
 
-def get_organizations_by_building(db: Session, building_id: int):
-    return db.query(models.Organization).filter(
-        models.Organization.building_id == building_id
-    ).options(joinedload(models.Organization.building), joinedload(models.Organization.activities)).all()
+def get_organizations_by_building(db: Session, building_id: int, cursor: Optional[str] = None,
+                                  limit: int = DEFAULT_PAGE_SIZE, view: str = FULL_VIEW):
+    return _organizations_page(organizations_by_building_query(db, building_id), cursor, limit, view)
 
 
-def get_organizations_by_activity(db: Session, activity_id: int):
-    # Получаем деятельность и все её дочерние деятельности
-    activity_ids = get_activity_tree_ids(db, activity_id)
+def get_organizations_by_activity(db: Session, activity_id: int, cursor: Optional[str] = None,
+                                  limit: int = DEFAULT_PAGE_SIZE, view: str = FULL_VIEW):
+    return _organizations_page(organizations_by_activity_query(db, activity_id), cursor, limit, view)
 
-    return db.query(models.Organization).join(
-        models.organization_activity
-    ).filter(
-        models.organization_activity.c.activity_id.in_(activity_ids)
-    ).options(joinedload(models.Organization.building), joinedload(models.Organization.activities)).all()
 
+def organizations_by_activity_query(db: Session, activity_id: int):
+    # Поддерево берем из замыкания в памяти, для неизвестной деятельности
+    # разворачиваем дерево в том же запросе, что и выборка организаций
+    activity_ids = _cached_activity_tree_ids(db, activity_id)
+    if activity_ids is not None:
+        activity_filter = models.organization_activity.c.activity_id.in_(sorted(activity_ids))
+    else:
+        activity_tree = activity_tree_cte(activity_id)
+        activity_filter = models.organization_activity.c.activity_id.in_(select(activity_tree.c.id))
 
-def get_activity_tree_ids(db: Session, activity_id: int) -> List[int]:
-    """Получает все ID деятельности в дереве, начиная с указанной"""
-    activity_ids = [activity_id]
+    # Полусоединение, чтобы организация с несколькими подходящими деятельностями не дублировалась
+    organization_ids = select(models.organization_activity.c.organization_id).where(activity_filter)
+    return db.query(models.Organization).filter(models.Organization.id.in_(organization_ids))
 
-    def get_children_ids(parent_id: int):
-        children = db.query(models.Activity).filter(models.Activity.parent_id == parent_id).all()
-        for child in children:
-            activity_ids.append(child.id)
-            get_children_ids(child.id)
 
-    get_children_ids(activity_id)
-    return activity_ids
+def _cached_activity_tree_ids(db: Session, activity_id: int):
+    if not activity_closure.ready:
+        return None
+    activity_closure.refresh_if_stale(db)
+    return activity_closure.descendants(activity_id)
 
 
-def get_organizations_in_radius(db: Session, latitude: float, longitude: float, radius_km: float):
-    """Поиск организаций в радиусе от точки"""
-    # Формула Haversine для расчета расстояния
-    organizations = db.query(models.Organization).join(models.Building).options(
-        joinedload(models.Organization.building),
-        joinedload(models.Organization.activities)
-    ).all()
+def activity_tree_cte(activity_id: int):
+    """Рекурсивный CTE с ID деятельности и всех её потомков (PostgreSQL и SQLite)"""
+    activity_tree = select(models.Activity.id).where(
+        models.Activity.id == activity_id
+    ).cte("activity_tree", recursive=True)
 
-    result = []
-    for org in organizations:
-        distance = calculate_distance(latitude, longitude, org.building.latitude, org.building.longitude)
-        if distance <= radius_km:
-            result.append(org)
+    return activity_tree.union_all(
+        select(models.Activity.id).where(models.Activity.parent_id == activity_tree.c.id)
+    )
 
-    return result
 
-
-def get_organizations_in_rectangle(db: Session, min_lat: float, max_lat: float, min_lon: float, max_lon: float):
+def get_activity_tree_ids(db: Session, activity_id: int) -> List[int]:
+    """Получает все ID деятельности в дереве, начиная с указанной"""
+    activity_tree = activity_tree_cte(activity_id)
+    return list(db.execute(select(activity_tree.c.id)).scalars())
+
+
+def get_organizations_in_radius(db: Session, latitude: float, longitude: float, radius_km: float,
+                                cursor: Optional[str] = None, limit: int = DEFAULT_PAGE_SIZE,
+                                view: str = FULL_VIEW):
+    """Поиск организаций в радиусе от точки, по возрастанию расстояния (keyset по (distance, id)).
+
+    Следующие страницы берут только кольцо от расстояния курсора до radius_km,
+    но расстояния до зданий в ограничивающем прямоугольнике считаются заново,
+    поэтому страница стоит O(зданий в круге) вычислений и O(организаций в кольце)
+    чтения из БД (без пространственного индекса - всех организаций в
+    прямоугольнике), а не константу, как keyset по id.
+    """
+    after = decode_cursor(cursor, (float, int))
+    ranked = rank_organizations_in_radius(
+        db, latitude, longitude, radius_km, min_distance_km=after[0] if after is not None else 0.0
+    )
+    if after is not None:
+        ranked = [key for key in ranked if key > after]
+    page, next_cursor = make_page(heapq.nsmallest(limit + 1, ranked), limit, lambda key: key)
+
+    organizations = _get_organizations_by_ids(db, [org_id for _, org_id in page], view)
+    return {"organizations": organizations, "next_cursor": next_cursor}
+
+
+def rank_organizations_in_radius(db: Session, latitude: float, longitude: float, radius_km: float,
+                                 min_distance_km: float = 0.0) -> List[Tuple[float, int]]:
+    """Пары (distance, organization_id) для организаций в кольце min_distance_km..radius_km, без сортировки"""
+    boxes = get_bounding_boxes(latitude, longitude, radius_km)
+
+    candidates = _indexed_buildings(db, boxes)
+    if candidates is not None:
+        # Расстояния считаем по координатам из индекса, id организаций берем только для подходящих зданий
+        distances = calculate_distances(
+            latitude, longitude,
+            [lat for _, lat, _ in candidates],
+            [lon for _, _, lon in candidates]
+        )
+        building_distances = {
+            building_id: distance
+            for (building_id, _, _), distance in zip(candidates, distances)
+            if min_distance_km <= distance <= radius_km
+        }
+        rows = db.query(models.Organization.id, models.Organization.building_id).filter(
+            models.Organization.building_id.in_(list(building_distances))
+        ).all() if building_distances else []
+        ranked = [(building_distances[building_id], org_id) for org_id, building_id in rows]
+    else:
+        # Сначала отсекаем здания ограничивающим прямоугольником на стороне БД,
+        # точное расстояние по формуле Haversine считаем только для попавших в него
+        box_filters = [
+            and_(
+                models.Building.latitude >= min_lat,
+                models.Building.latitude <= max_lat,
+                models.Building.longitude >= min_lon,
+                models.Building.longitude <= max_lon
+            )
+            for min_lat, max_lat, min_lon, max_lon in boxes
+        ]
+        rows = db.query(
+            models.Organization.id, models.Building.latitude, models.Building.longitude
+        ).join(models.Building).filter(or_(*box_filters)).all()
+        distances = calculate_distances(
+            latitude, longitude,
+            [lat for _, lat, _ in rows],
+            [lon for _, _, lon in rows]
+        )
+        ranked = [
+            (distance, org_id)
+            for (org_id, _, _), distance in zip(rows, distances)
+            if min_distance_km <= distance <= radius_km
+        ]
+
+    return ranked
+
+
+def _indexed_buildings(db: Session, boxes: List[Tuple[float, float, float, float]]):
+    """Кандидаты (id, lat, lon) из пространственного индекса или None, если индекс использовать нельзя"""
+    if not building_index.ready:
+        return None
+    building_index.refresh_if_stale(db)
+    candidates = building_index.query_boxes(boxes)
+    # Слишком длинный список IN дороже, чем диапазонный запрос к БД
+    if len(candidates) > GEO_INDEX_MAX_CANDIDATES:
+        return None
+    return candidates
+
+
+def get_bounding_boxes(latitude: float, longitude: float, radius_km: float) -> List[Tuple[float, float, float, float]]:
+    """Ограничивающие прямоугольники (min_lat, max_lat, min_lon, max_lon) для круга радиусом radius_km.
+
+    Вблизи полюсов прямоугольник расширяется на все долготы, при пересечении
+    антимеридиана он разбивается на два прямоугольника.
+    """
+    angular_radius = radius_km / EARTH_RADIUS_KM + BOUNDING_BOX_MARGIN
+    lat = math.radians(latitude)
+    min_lat = lat - angular_radius
+    max_lat = lat + angular_radius
+
+    if min_lat <= -math.pi / 2 or max_lat >= math.pi / 2:
+        # Круг накрывает полюс - подходят любые долготы
+        return [(
+            max(math.degrees(min_lat), -90.0),
+            min(math.degrees(max_lat), 90.0),
+            -180.0,
+            180.0
+        )]
+
+    delta_lon = math.asin(min(math.sin(angular_radius) / math.cos(lat), 1.0))
+    lon = math.radians(((longitude + 180.0) % 360.0) - 180.0)
+    min_lon = lon - delta_lon
+    max_lon = lon + delta_lon
+    min_lat, max_lat = math.degrees(min_lat), math.degrees(max_lat)
+
+    if min_lon < -math.pi:
+        return [
+            (min_lat, max_lat, math.degrees(min_lon + 2 * math.pi), 180.0),
+            (min_lat, max_lat, -180.0, math.degrees(max_lon))
+        ]
+    if max_lon > math.pi:
+        return [
+            (min_lat, max_lat, math.degrees(min_lon), 180.0),
+            (min_lat, max_lat, -180.0, math.degrees(max_lon - 2 * math.pi))
+        ]
+    return [(min_lat, max_lat, math.degrees(min_lon), math.degrees(max_lon))]
+
+
+def get_organizations_in_rectangle(db: Session, min_lat: float, max_lat: float, min_lon: float, max_lon: float,
+                                   cursor: Optional[str] = None, limit: int = DEFAULT_PAGE_SIZE,
+                                   view: str = FULL_VIEW):
     """Поиск организаций в прямоугольной области"""
-    return db.query(models.Organization).join(models.Building).filter(
+    query = organizations_in_rectangle_query(db, min_lat, max_lat, min_lon, max_lon)
+    return _organizations_page(query, cursor, limit, view)
+
+
+def organizations_in_rectangle_query(db: Session, min_lat: float, max_lat: float, min_lon: float, max_lon: float):
+    candidates = _indexed_buildings(db, [(min_lat, max_lat, min_lon, max_lon)])
+    if candidates is not None:
+        return db.query(models.Organization).filter(
+            models.Organization.building_id.in_([building_id for building_id, _, _ in candidates])
+        )
+
+    # Полусоединение по id зданий, чтобы компактное представление могло присоединить здания само
+    building_ids = select(models.Building.id).where(
         and_(
             models.Building.latitude >= min_lat,
             models.Building.latitude <= max_lat,
             models.Building.longitude >= min_lon,
             models.Building.longitude <= max_lon
         )
-    ).options(joinedload(models.Organization.building), joinedload(models.Organization.activities)).all()
+    )
+    return db.query(models.Organization).filter(models.Organization.building_id.in_(building_ids))
 
 
 def calculate_distance(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
     """Расчет расстояния между двумя точками по формуле Haversine"""
-    R = 6371  # Радиус Земли в км
+    R = EARTH_RADIUS_KM
 
     dlat = math.radians(lat2 - lat1)
     dlon = math.radians(lon2 - lon1)
@@ -80,21 +340,101 @@ def calculate_distance(lat1: float, lon1: float, lat2: float, lon2: float) -> fl
     return R * c
 
 
-def get_all_buildings(db: Session):
-    return db.query(models.Building).all()
+def calculate_distances(latitude: float, longitude: float,
+                        latitudes: Sequence[float], longitudes: Sequence[float]) -> List[float]:
+    """Расстояния (км) от точки до набора точек за один векторный проход NumPy.
 
+    Формула та же, что в calculate_distance; без NumPy и на маленьких наборах
+    используется скалярный вариант.
+    """
+    if np is None or len(latitudes) < VECTORIZE_MIN_SIZE:
+        return [calculate_distance(latitude, longitude, lat, lon) for lat, lon in zip(latitudes, longitudes)]
 
-def get_organization_by_id(db: Session, org_id: int):
-    return db.query(models.Organization).filter(
-        models.Organization.id == org_id
-    ).options(joinedload(models.Organization.building), joinedload(models.Organization.activities)).first()
+    lat2 = np.asarray(latitudes, dtype=np.float64)
+    lon2 = np.asarray(longitudes, dtype=np.float64)
+
+    dlat = np.radians(lat2 - latitude)
+    dlon = np.radians(lon2 - longitude)
 
+    sin_dlat = np.sin(dlat / 2)
+    sin_dlon = np.sin(dlon / 2)
+    a = (sin_dlat * sin_dlat +
+         math.cos(math.radians(latitude)) * np.cos(np.radians(lat2)) *
+         sin_dlon * sin_dlon)
+    c = 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
 
-def search_organizations_by_name(db: Session, name: str, skip: int = 0, limit: int = 100):
-    return db.query(models.Organization).filter(
-        models.Organization.name.ilike(f"%{name}%")
-    ).options(joinedload(models.Organization.building), joinedload(models.Organization.activities)).offset(skip).limit(
-        limit).all()
+    return (EARTH_RADIUS_KM * c).tolist()
+
+
+def iter_buildings(db: Session, batch_size: int = STREAM_BATCH_SIZE):
+    """Все здания в порядке id через серверный курсор (yield_per)"""
+    return db.query(models.Building).order_by(models.Building.id).yield_per(batch_size)
+
+
+def get_buildings(db: Session, cursor: Optional[str] = None, limit: int = DEFAULT_PAGE_SIZE):
+    after = decode_cursor(cursor, (int,))
+    query = db.query(models.Building)
+    if after is not None:
+        query = query.filter(models.Building.id > after[0])
+
+    buildings = query.order_by(models.Building.id).limit(limit + 1).all()
+    buildings, next_cursor = make_page(buildings, limit, lambda building: (building.id,))
+    return {"buildings": buildings, "next_cursor": next_cursor}
+
+
+def get_organization_by_id(db: Session, org_id: int, view: str = FULL_VIEW):
+    return _select_view(db.query(models.Organization).filter(
+        models.Organization.id == org_id
+    ), view).first()
+
+
+def search_organizations_by_name(db: Session, name: str, cursor: Optional[str] = None,
+                                 limit: int = DEFAULT_PAGE_SIZE, ranked: bool = False,
+                                 view: str = FULL_VIEW):
+    """Поиск по подстроке в названии (по id) или по релевантности (ranked=True, по (score, id))"""
+    dialect_name = db.get_bind().dialect.name
+
+    if ranked and name.strip():
+        if dialect_name == "postgresql":
+            ts_vector = search.postgres_ts_vector()
+            ts_query = search.postgres_ts_query(name)
+            score = search.postgres_ts_rank(ts_vector, ts_query)
+            query = db.query(models.Organization, score).filter(ts_vector.op("@@")(ts_query))
+            return _ranked_organizations_page(query, score, cursor, limit, view)
+        if search.use_sqlite_fts(dialect_name, name):
+            matches = search.sqlite_fts_matches(name)
+            query = db.query(models.Organization, matches.c.score).join(
+                matches, matches.c.organization_id == models.Organization.id
+            )
+            return _ranked_organizations_page(query, matches.c.score, cursor, limit, view)
+
+    query = db.query(models.Organization)
+    if search.use_sqlite_fts(dialect_name, name):
+        matches = search.sqlite_fts_matches(name)
+        query = query.filter(models.Organization.id.in_(select(matches.c.organization_id)))
+    elif name:
+        # В PostgreSQL обслуживается триграммным индексом ix_organizations_name_trgm
+        query = query.filter(models.Organization.name.ilike(f"%{name}%"))
+    return _organizations_page(query, cursor, limit, view)
+
+
+def _ranked_organizations_page(query, score, cursor: Optional[str], limit: int, view: str = FULL_VIEW):
+    """Страница организаций по убыванию релевантности, keyset по (score, id)"""
+    after = decode_cursor(cursor, (float, int))
+    if after is not None:
+        query = query.filter(or_(
+            score < after[0],
+            and_(score == after[0], models.Organization.id > after[1])
+        ))
+
+    rows = _select_view(query, view, score).order_by(score.desc(), models.Organization.id).limit(limit + 1).all()
+
+    if view == COMPACT_VIEW:
+        # Компактная строка: колонки представления и score последним
+        rows, next_cursor = make_page(rows, limit, lambda row: (row[-1], row.id))
+        return {"organizations": rows, "next_cursor": next_cursor}
+    rows, next_cursor = make_page(rows, limit, lambda row: (row[1], row[0].id))
+    return {"organizations": [org for org, _ in rows], "next_cursor": next_cursor}
 
 
 def create_building(db: Session, building: schemas.BuildingCreate):
@@ -102,21 +442,32 @@ def create_building(db: Session, building: schemas.BuildingCreate):
     db.add(db_building)
     db.commit()
     db.refresh(db_building)
+    building_index.add(db_building.id, db_building.latitude, db_building.longitude)
+    _data_changed(["buildings"])
     return db_building
 
 
 def create_activity(db: Session, activity: schemas.ActivityCreate):
     # Проверяем уровень вложенности
     if activity.parent_id:
-        parent = db.query(models.Activity).filter(models.Activity.id == activity.parent_id).first()
-        if parent and parent.level >= 3:
-            raise ValueError("Максимальный уровень вложенности - 3")
-        activity.level = parent.level + 1 if parent else 1
+        parent_level = activity_closure.level(activity.parent_id)
+        if parent_level is None:
+            parent = db.query(models.Activity).filter(models.Activity.id == activity.parent_id).first()
+            parent_level = parent.level if parent else None
+        if parent_level and parent_level >= MAX_ACTIVITY_LEVEL:
+            raise ValueError(f"Максимальный уровень вложенности - {MAX_ACTIVITY_LEVEL}")
+        activity.level = parent_level + 1 if parent_level else 1
 
     db_activity = models.Activity(**activity.dict())
     db.add(db_activity)
     db.commit()
     db.refresh(db_activity)
+    activity_closure.add(db_activity.id, db_activity.parent_id, db_activity.level)
+    # Изменился список children родителя во всех ответах, где он вложен
+    changed = ["activities"]
+    if db_activity.parent_id is not None:
+        changed.append(f"activity:{db_activity.parent_id}")
+    _data_changed(changed)
     return db_activity
 
 
@@ -135,4 +486,274 @@ def create_organization(db: Session, organization: schemas.OrganizationCreate):
 
     db.commit()
     db.refresh(db_organization)
-    return db_organization
\ No newline at end of file
+    _data_changed(sorted(_organization_write_tags(
+        db, db_organization.id, db_organization.building_id, [activity.id for activity in db_organization.activities]
+    )))
+    return db_organization
+
+
+def bulk_create_buildings(db: Session, buildings: List[schemas.BuildingCreate]) -> List[Union[int, str]]:
+    """Вставляет пачку зданий многострочным INSERT ... RETURNING.
+
+    Возвращает для каждого элемента id созданного здания или текст ошибки.
+    """
+    if not buildings:
+        return []
+    rows = [building.dict() for building in buildings]
+    results = _insert_chunk(db, lambda chunk: db.scalars(
+        insert(models.Building).returning(models.Building.id, sort_by_parameter_order=True), chunk
+    ).all(), rows)
+
+    building_index.load(
+        (building_id, row["latitude"], row["longitude"])
+        for building_id, row in zip(results, rows) if isinstance(building_id, int)
+    )
+    _data_changed(["buildings"])
+    return results
+
+
+def bulk_create_activities(db: Session, activities: List[schemas.ActivityCreate]) -> List[Union[int, str]]:
+    """Вставляет пачку деятельностей; родитель может быть создан раньше в той же пачке.
+
+    Уровни вложенности проверяются по замыканию в памяти, неизвестные
+    родители догружаются одним запросом. Если родителя еще нет, накопленные
+    строки вставляются и родитель ищется снова, поэтому результат не зависит
+    от того, где тело запроса разбито на пачки.
+    """
+    results: List[Union[int, str, None]] = [None] * len(activities)
+    parent_levels = {
+        activity.parent_id: activity_closure.level(activity.parent_id)
+        for activity in activities if activity.parent_id
+    }
+    unknown_parents = [parent_id for parent_id, level in parent_levels.items() if level is None]
+    if unknown_parents:
+        for parent_id, level in db.query(models.Activity.id, models.Activity.level).filter(
+            models.Activity.id.in_(unknown_parents)
+        ):
+            parent_levels[parent_id] = level or 1
+
+    rows, positions = [], []
+    changed = set()
+
+    def flush():
+        ids = _insert_chunk(db, lambda chunk: db.scalars(
+            insert(models.Activity).returning(models.Activity.id, sort_by_parameter_order=True), chunk
+        ).all(), rows)
+        for position, activity_id, row in zip(positions, ids, rows):
+            results[position] = activity_id
+            if not isinstance(activity_id, int):
+                continue
+            parent_levels[activity_id] = row["level"]
+            activity_closure.add(activity_id, row["parent_id"], row["level"])
+            changed.add("activities")
+            if row["parent_id"] is not None:
+                changed.add(f"activity:{row['parent_id']}")
+        rows.clear()
+        positions.clear()
+
+    for position, activity in enumerate(activities):
+        if activity.parent_id:
+            parent_level = parent_levels.get(activity.parent_id)
+            if parent_level is None and rows:
+                # Родитель может быть среди еще не вставленных строк этой пачки
+                flush()
+                parent_level = parent_levels.get(activity.parent_id)
+            if parent_level is None:
+                results[position] = "Родительская деятельность не найдена"
+                continue
+            if parent_level >= MAX_ACTIVITY_LEVEL:
+                results[position] = f"Максимальный уровень вложенности - {MAX_ACTIVITY_LEVEL}"
+                continue
+            activity.level = parent_level + 1
+        rows.append(activity.dict())
+        positions.append(position)
+
+    if rows:
+        flush()
+    if changed:
+        _data_changed(sorted(changed))
+    return results
+
+
+def bulk_create_organizations(db: Session, organizations: List[schemas.OrganizationCreate]) -> List[Union[int, str]]:
+    """Вставляет пачку организаций многострочным INSERT, связи с деятельностями - одним INSERT.
+
+    Несуществующие здания и деятельности проверяются одним запросом на
+    пачку и возвращаются как ошибки отдельных элементов.
+    """
+    results: List[Union[int, str, None]] = [None] * len(organizations)
+    building_ids = {org.building_id for org in organizations}
+    existing_buildings = set(db.scalars(
+        select(models.Building.id).where(models.Building.id.in_(building_ids))
+    )) if building_ids else set()
+    activity_ids = {activity_id for org in organizations for activity_id in org.activity_ids}
+    existing_activities = set(db.scalars(
+        select(models.Activity.id).where(models.Activity.id.in_(activity_ids))
+    )) if activity_ids else set()
+
+    rows, positions, links = [], [], []
+    for position, organization in enumerate(organizations):
+        if organization.building_id not in existing_buildings:
+            results[position] = "Здание не найдено"
+            continue
+        missing = sorted(set(organization.activity_ids) - existing_activities)
+        if missing:
+            results[position] = f"Виды деятельности не найдены: {missing}"
+            continue
+        org_data = organization.dict()
+        links.append(sorted(set(org_data.pop('activity_ids', []))))
+        rows.append(org_data)
+        positions.append(position)
+
+    def insert_organizations(chunk):
+        ids = db.scalars(
+            insert(models.Organization).returning(models.Organization.id, sort_by_parameter_order=True),
+            [row for row, _ in chunk]
+        ).all()
+        pairs = [
+            {"organization_id": org_id, "activity_id": activity_id}
+            for org_id, (_, org_activity_ids) in zip(ids, chunk)
+            for activity_id in org_activity_ids
+        ]
+        if pairs:
+            db.execute(insert(models.organization_activity), pairs)
+        return ids
+
+    if rows:
+        ids = _insert_chunk(db, insert_organizations, list(zip(rows, links)))
+
+        changed = set()
+        for position, org_id, row, org_activity_ids in zip(positions, ids, rows, links):
+            results[position] = org_id
+            if not isinstance(org_id, int):
+                continue
+            changed |= _organization_write_tags(db, org_id, row["building_id"], org_activity_ids)
+        _data_changed(sorted(changed))
+    return results
+
+
+def directory_is_empty(db: Session) -> bool:
+    """Нет ни зданий, ни деятельностей, ни организаций (восстановление выгрузки возможно только в пустую базу)"""
+    return not any(
+        db.query(model.id).limit(1).first() for model in (models.Building, models.Activity, models.Organization)
+    )
+
+
+def restore_rows(db: Session, table, rows: List[dict], links: Sequence[dict] = ()) -> Optional[str]:
+    """Вставляет пачку строк выгрузки с исходными id одной транзакцией.
+
+    links - связи organization_activity для пачки организаций. Возвращает текст
+    ошибки БД или None. Индексы в памяти, кэш и версии обновляет finish_restore
+    после загрузки всей выгрузки.
+    """
+    try:
+        db.execute(insert(table), rows)
+        if links:
+            db.execute(insert(models.organization_activity), list(links))
+        db.commit()
+    except SQLAlchemyError as exc:
+        db.rollback()
+        return _db_error(exc)
+    return None
+
+
+def finish_restore(db: Session):
+    """Сдвигает последовательности id после вставки явных id и перестраивает индексы в памяти"""
+    if db.get_bind().dialect.name == "postgresql":
+        for table_name in ("buildings", "activities", "organizations"):
+            db.execute(text(
+                f"SELECT setval(pg_get_serial_sequence('{table_name}', 'id'), "
+                f"COALESCE((SELECT MAX(id) FROM {table_name}), 1))"
+            ))
+        db.commit()
+    building_index.rebuild(db)
+    activity_closure.rebuild(db)
+    get_cache().clear()
+    data_versions.bump(["buildings", "activities", "organizations"])
+
+
+def _insert_chunk(db: Session, insert_rows: Callable[[list], Sequence[int]], rows: list) -> List[Union[int, str]]:
+    """Вставляет пачку одной транзакцией, при ошибке БД - по одной строке.
+
+    Одна некорректная строка (дубликат, нарушение ограничения) не отменяет
+    остальные: каждая строка получает свой id или свой текст ошибки.
+    """
+    try:
+        ids = list(insert_rows(rows))
+        db.commit()
+        return ids
+    except SQLAlchemyError as exc:
+        db.rollback()
+        if len(rows) == 1:
+            return [_db_error(exc)]
+    return [result for row in rows for result in _insert_chunk(db, insert_rows, [row])]
+
+
+def _db_error(exc: SQLAlchemyError) -> str:
+    """Текст ошибки для клиента; сообщение драйвера (имена таблиц, значения) пишется только в лог"""
+    logger.warning("Ошибка записи в БД: %s", str(getattr(exc, "orig", None) or exc).strip())
+    if isinstance(exc, IntegrityError):
+        return "Нарушено ограничение целостности данных"
+    return "Ошибка записи в базу данных"
+
+
+def get_api_key_by_hash(db: Session, key_hash: str):
+    return db.query(models.ApiKey).filter(models.ApiKey.key_hash == key_hash).first()
+
+
+def get_api_keys(db: Session):
+    return db.query(models.ApiKey).order_by(models.ApiKey.id).all()
+
+
+def create_api_key(db: Session, api_key: schemas.ApiKeyCreate, key_hash: str):
+    db_api_key = models.ApiKey(
+        name=api_key.name,
+        key_hash=key_hash,
+        scopes=sorted({scope.value for scope in api_key.scopes}),
+        enabled=True
+    )
+    db.add(db_api_key)
+    db.commit()
+    db.refresh(db_api_key)
+    return db_api_key
+
+
+def revoke_api_key(db: Session, api_key_id: int):
+    """Отключает ключ; None, если ключа нет"""
+    db_api_key = db.get(models.ApiKey, api_key_id)
+    if db_api_key is None:
+        return None
+    db_api_key.enabled = False
+    db.commit()
+    db.refresh(db_api_key)
+    return db_api_key
+
+
+def _data_changed(tags: List[str]):
+    """Инвалидирует кэш ответов и увеличивает версии данных после записи"""
+    # Сначала кэш, потом версии: ответ с новым ETag не может прийти из старой записи кэша
+    get_cache().invalidate(tags)
+    data_versions.bump(tags)
+
+
+def _organization_write_tags(db: Session, organization_id: int, building_id: int,
+                             activity_ids: List[int]) -> Set[str]:
+    """Теги кэша и версий списков, в которые попадает организация"""
+    tags = {"organizations", f"organization:{organization_id}", f"building:{building_id}"}
+    for activity_id in activity_ids:
+        tags.update(f"activity-orgs:{ancestor_id}" for ancestor_id in _activity_ancestors(db, activity_id))
+    return tags
+
+
+def _activity_ancestors(db: Session, activity_id: int) -> List[int]:
+    """Деятельность и её предки: из замыкания в памяти или по связям parent"""
+    ancestors = activity_closure.ancestors(activity_id)
+    if ancestors is not None:
+        return ancestors
+
+    ancestors = []
+    activity = db.get(models.Activity, activity_id)
+    while activity is not None and activity.id not in ancestors:
+        ancestors.append(activity.id)
+        activity = activity.parent
+    return ancestors
@@ -1,9 +1,22 @@
+from contextlib import asynccontextmanager
 from sqlalchemy.orm import Session
-from .database import SessionLocal
+from starlette.concurrency import run_in_threadpool
+from .database import SessionLocal, AsyncSessionLocal, DB_MODE
+
+@asynccontextmanager
+async def open_db():
+    """Сессия БД внутри обработчика: для эндпоинтов, которым она нужна не в каждой ветке"""
+    if DB_MODE == "async":
+        async with AsyncSessionLocal() as db:
+            yield db
+        return
 
-def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        await run_in_threadpool(db.close)
+
+async def get_db():
+    async with open_db() as db:
+        yield db
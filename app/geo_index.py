@@ -0,0 +1,122 @@
+from sqlalchemy.orm import Session
+from typing import Dict, Iterable, List, Tuple
+from . import models
+from .watermark import IdWatermark, RefreshGate
+import math
+import os
+import threading
+
+# Размер ячейки сетки в градусах
+CELL_SIZE_DEG = float(os.getenv("GEO_INDEX_CELL_DEG", "0.1"))
+# Как часто подгружать здания, созданные другими процессами (секунды)
+REFRESH_INTERVAL = float(os.getenv("GEO_INDEX_REFRESH_SECONDS", "30"))
+
+
+class BuildingGridIndex:
+    """Сеточный индекс зданий в памяти процесса: building_id -> (lat, lon).
+
+    Здания только добавляются, поэтому индекс строится один раз при старте,
+    пополняется при create_building и периодически догружает строки,
+    созданные другими воркерами: новее границы синхронизации и в недавних
+    пропусках id (см. IdWatermark).
+    """
+
+    def __init__(self, cell_size: float = CELL_SIZE_DEG):
+        self.cell_size = cell_size
+        self._cells: Dict[Tuple[int, int], List[Tuple[int, float, float]]] = {}
+        self._coords: Dict[int, Tuple[float, float]] = {}
+        self._lock = threading.RLock()
+        self._watermark = IdWatermark()
+        self._refresh = RefreshGate(REFRESH_INTERVAL)
+        self.ready = False
+
+    def _cell(self, latitude: float, longitude: float) -> Tuple[int, int]:
+        return math.floor(latitude / self.cell_size), math.floor(longitude / self.cell_size)
+
+    def __len__(self):
+        return len(self._coords)
+
+    def add(self, building_id: int, latitude: float, longitude: float):
+        with self._lock:
+            if building_id in self._coords:
+                return
+            self._coords[building_id] = (latitude, longitude)
+            self._cells.setdefault(self._cell(latitude, longitude), []).append((building_id, latitude, longitude))
+
+    def load(self, rows: Iterable[Tuple[int, float, float]]):
+        for building_id, latitude, longitude in rows:
+            self.add(building_id, latitude, longitude)
+
+    def rebuild(self, db: Session):
+        """Полностью перестраивает индекс по таблице buildings"""
+        with self._lock:
+            self._cells = {}
+            self._coords = {}
+            self._watermark.reset()
+            self._sync(db)
+            self.ready = True
+
+    def refresh_if_stale(self, db: Session):
+        """Догружает здания, появившиеся после последней синхронизации"""
+        if not self.ready or not self._refresh.begin():
+            return
+        try:
+            with self._lock:
+                self._sync(db)
+        finally:
+            self._refresh.end()
+
+    def _sync(self, db: Session):
+        # Граница двигается только по прочитанным строкам: собственные вставки процесса
+        # (add) не должны перепрыгнуть строки других воркеров, которые еще не прочитаны
+        rows = db.query(
+            models.Building.id, models.Building.latitude, models.Building.longitude
+        ).filter(self._watermark.condition(models.Building.id)).yield_per(10000)
+        ids = []
+        for building_id, latitude, longitude in rows:
+            self.add(building_id, latitude, longitude)
+            ids.append(building_id)
+        self._watermark.advance(ids)
+        self._refresh.synced()
+
+    def query_rectangle(self, min_lat: float, max_lat: float,
+                        min_lon: float, max_lon: float) -> List[Tuple[int, float, float]]:
+        """Здания (id, lat, lon) внутри прямоугольника, границы включительно"""
+        if min_lat > max_lat or min_lon > max_lon:
+            return []
+        min_cy, min_cx = self._cell(min_lat, min_lon)
+        max_cy, max_cx = self._cell(max_lat, max_lon)
+
+        with self._lock:
+            cells = self._cells
+            # Для широких областей дешевле пройти по занятым ячейкам, чем по всем ячейкам области
+            if (max_cy - min_cy + 1) * (max_cx - min_cx + 1) > len(cells):
+                buckets = [
+                    bucket for (cy, cx), bucket in cells.items()
+                    if min_cy <= cy <= max_cy and min_cx <= cx <= max_cx
+                ]
+            else:
+                buckets = [
+                    cells[(cy, cx)]
+                    for cy in range(min_cy, max_cy + 1)
+                    for cx in range(min_cx, max_cx + 1)
+                    if (cy, cx) in cells
+                ]
+
+            return [
+                (building_id, latitude, longitude)
+                for bucket in buckets
+                for building_id, latitude, longitude in bucket
+                if min_lat <= latitude <= max_lat and min_lon <= longitude <= max_lon
+            ]
+
+    def query_boxes(self, boxes: Iterable[Tuple[float, float, float, float]]) -> List[Tuple[int, float, float]]:
+        """Здания внутри любого из прямоугольников (min_lat, max_lat, min_lon, max_lon)"""
+        result = {}
+        for box in boxes:
+            for building_id, latitude, longitude in self.query_rectangle(*box):
+                result[building_id] = (building_id, latitude, longitude)
+        return list(result.values())
+
+
+building_index = BuildingGridIndex()
@@ -0,0 +1,167 @@
+from alembic.script import ScriptDirectory
+from alembic.util import CommandError
+from fastapi.responses import JSONResponse
+from functools import lru_cache
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import DBAPIError
+from starlette.concurrency import run_in_threadpool
+from typing import Optional, Tuple
+from .activity_tree import activity_closure
+from .cache import CACHE_ENABLED, get_cache
+from .database import SQLALCHEMY_DATABASE_URL, async_engine, engine, get_pool_stats
+from .geo_index import building_index
+import asyncio
+import math
+import os
+import time
+
+# Таймаут проверки БД в /ready (секунды): недоступная БД или пустой пул не задерживают пробу
+READINESS_DB_TIMEOUT = float(os.getenv("READINESS_DB_TIMEOUT", "2"))
+# Доля занятых соединений, с которой пул считается насыщенным
+POOL_SATURATION_THRESHOLD = float(os.getenv("POOL_SATURATION_THRESHOLD", "0.9"))
+ALEMBIC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "alembic")
+
+STARTED_AT = time.time()
+
+
+def liveness() -> dict:
+    """Процесс жив и обслуживает цикл событий; без обращений к БД"""
+    return {"status": "ok", "uptime": round(time.time() - STARTED_AT, 1)}
+
+
+@lru_cache(maxsize=None)
+def migration_head() -> Optional[str]:
+    """Последняя ревизия в alembic/versions (файлы читаются один раз)"""
+    try:
+        return ScriptDirectory(ALEMBIC_DIR).get_current_head()
+    except CommandError:
+        return None
+
+
+def _is_missing_table(error: DBAPIError) -> bool:
+    """Ошибка "таблицы нет": undefined_table (42P01) в PostgreSQL, "no such table" в SQLite"""
+    orig = error.orig
+    return getattr(orig, "pgcode", None) == "42P01" or "no such table" in str(orig)
+
+
+def _probe(connection) -> Optional[str]:
+    """SELECT 1 и текущая ревизия миграций БД (None, если alembic не применялся)"""
+    connection.execute(text("SELECT 1"))
+    try:
+        return connection.execute(text("SELECT version_num FROM alembic_version")).scalar()
+    except DBAPIError as exc:
+        if _is_missing_table(exc):
+            return None
+        raise
+
+
+@lru_cache(maxsize=None)
+def probe_engine():
+    """Движок проб в синхронном режиме: поток пула нельзя прервать по таймауту asyncio,
+    поэтому ожидание соединения, подключение и запрос ограничены READINESS_DB_TIMEOUT
+    на уровне пула и драйвера. Одно соединение - пробы не занимают пул запросов.
+    """
+    if engine.dialect.name != "postgresql":
+        # SQLite локальный (и in-memory база видна только основному движку)
+        return engine
+    return create_engine(
+        SQLALCHEMY_DATABASE_URL,
+        pool_size=1,
+        max_overflow=0,
+        pool_timeout=READINESS_DB_TIMEOUT,
+        connect_args={
+            "connect_timeout": max(1, math.ceil(READINESS_DB_TIMEOUT)),
+            "options": f"-c statement_timeout={int(READINESS_DB_TIMEOUT * 1000)}",
+        },
+    )
+
+
+def _probe_sync() -> Optional[str]:
+    with probe_engine().connect() as connection:
+        return _probe(connection)
+
+
+async def _probe_database() -> Optional[str]:
+    if async_engine is not None:
+        async with async_engine.connect() as connection:
+            return await connection.run_sync(_probe)
+    return await run_in_threadpool(_probe_sync)
+
+
+async def check_database() -> Tuple[dict, Optional[str]]:
+    """Проверка БД и миграций с таймаутом READINESS_DB_TIMEOUT.
+
+    В асинхронном режиме проба отменяется по таймауту, в синхронном поток
+    освобождается по таймаутам пула и драйвера движка probe_engine.
+    """
+    start = time.perf_counter()
+    try:
+        revision = await asyncio.wait_for(_probe_database(), READINESS_DB_TIMEOUT)
+    except asyncio.TimeoutError:
+        return {"status": "error", "error": f"нет ответа за {READINESS_DB_TIMEOUT} сек"}, None
+    except Exception as exc:
+        # Текст ошибки драйвера может содержать адрес БД, а эндпоинт открыт без ключа
+        return {"status": "error", "error": type(exc).__name__}, None
+    return {"status": "ok", "latency_ms": round((time.perf_counter() - start) * 1000, 2)}, revision
+
+
+def check_migrations(revision: Optional[str], database_ok: bool) -> dict:
+    """Ревизия БД совпадает с последней миграцией кода (без таблицы alembic_version - не проверяется)"""
+    head = migration_head()
+    if not database_ok or revision is None or head is None:
+        status = "unknown"
+    else:
+        status = "ok" if revision == head else "outdated"
+    return {"status": status, "current": revision, "head": head}
+
+
+def check_pools() -> dict:
+    """Занятость пулов соединений; насыщение отмечается, но не снимает готовность"""
+    pools = {}
+    for stats in get_pool_stats():
+        item = {"checked_out": stats.get("checked_out"), "timeouts": stats.get("timeouts")}
+        if stats.get("size") is not None:
+            capacity = stats["size"] + stats["max_overflow"]
+            item["capacity"] = capacity
+            item["saturation"] = round(stats["checked_out"] / capacity, 3) if capacity else 1.0
+            item["status"] = "saturated" if item["saturation"] >= POOL_SATURATION_THRESHOLD else "ok"
+        else:
+            item["status"] = "ok"
+        pools[stats["engine"]] = item
+    return pools
+
+
+def check_caches() -> dict:
+    """Индексы в памяти построены; размер и попадания кэша ответов"""
+    cache = get_cache()
+    hits, misses = getattr(cache, "hits", None), getattr(cache, "misses", None)
+    return {
+        "status": "ok" if building_index.ready and activity_closure.ready else "warming",
+        "building_index": {"ready": building_index.ready, "size": len(building_index)},
+        "activity_closure": {"ready": activity_closure.ready, "size": len(activity_closure)},
+        "response_cache": {
+            "enabled": CACHE_ENABLED,
+            "entries": len(cache) if hasattr(cache, "__len__") else None,
+            "hit_ratio": round(hits / (hits + misses), 3) if hits is not None and hits + misses else None,
+        },
+    }
+
+
+async def readiness_response() -> JSONResponse:
+    """Готовность принимать трафик: 200, если БД отвечает, схема актуальна и индексы построены, иначе 503"""
+    database, revision = await check_database()
+    checks = {
+        "database": database,
+        "migrations": check_migrations(revision, database["status"] == "ok"),
+        "pools": check_pools(),
+        "caches": check_caches(),
+    }
+    ready = (
+        database["status"] == "ok"
+        and checks["migrations"]["status"] != "outdated"
+        and checks["caches"]["status"] == "ok"
+    )
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={"status": "ready" if ready else "not_ready", "checks": checks},
+    )
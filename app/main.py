@@ -1,10 +1,24 @@
-from fastapi import FastAPI, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
-from typing import List, Optional
-from . import crud, models, schemas
-from .database import engine
-from .dependencies import get_db
-from .auth import verify_api_key
+from fastapi import FastAPI, Depends, HTTPException, Query, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from typing import List, Optional, Union
+from . import crud, models, schemas, search
+from .database import engine, SessionLocal, DbSession, run_db, get_pool_stats
+from .dependencies import get_db, open_db
+from .auth import (
+    ApiKeyInfo, api_key_cache, generate_api_key, hash_api_key,
+    verify_admin_api_key, verify_api_key, verify_write_api_key
+)
+from .activity_tree import activity_closure
+from .backup import export_response, restore_export
+from .bulk import run_bulk
+from .cache import get_cache, make_cache_key, organization_tags
+from .geo_index import building_index
+from .health import liveness, readiness_response
+from .metrics import MetricsMiddleware, QueryTimingMiddleware, mark_process_dead, metrics_response
+from .versions import data_versions, etag_matches, make_etag
+from .pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, InvalidCursor
+from .serialization import run_db_json, to_json
+from .streaming import ndjson_response, wants_stream
 
 # Создаем таблицы
 models.Base.metadata.create_all(bind=engine)
@@ -14,116 +28,380 @@ app = FastAPI(
     description="REST API для справочника организаций, зданий и деятельности",
     version="1.0.0"
 )
+app.add_middleware(MetricsMiddleware)
+app.add_middleware(QueryTimingMiddleware)
+
+
+@app.on_event("startup")
+def build_in_memory_indexes():
+    """Строим индекс поиска по названию (SQLite), пространственный индекс зданий и замыкание дерева деятельности"""
+    if engine.dialect.name == "sqlite":
+        with engine.begin() as connection:
+            search.ensure_sqlite_fts(connection)
+
+    with SessionLocal() as db:
+        building_index.rebuild(db)
+        activity_closure.rebuild(db)
+
+
+@app.on_event("shutdown")
+def remove_process_metrics():
+    mark_process_dead()
+
+
+async def cached_response(request: Request, db: DbSession, versions: List[str], tags, fn, *args,
+                          response_model, not_found=None):
+    """Условный и кэшируемый ответ GET.
+
+    Ответ берется из кэша или вычисляется crud-функцией, сериализуется и
+    сохраняется в кэш с тегами tags(result), по которым он инвалидируется
+    при записи данных. ETag - хэш тела ответа, поэтому If-None-Match
+    проверяется только после того, как ресурс найден (If-None-Match: * для
+    отсутствующего ресурса дает 404), и совпадает у всех воркеров.
+    Из кэша 304 отдается без обращения к БД.
+    Сериализация и теги считаются по ORM-объектам внутри сессии.
+    """
+    key = make_cache_key(fn, args)
+    cache = get_cache()
+    body = cache.get(key)
+    cache_status = "HIT"
+    if body is None:
+        current_versions = data_versions.get(versions)
+
+        def load(session):
+            result = fn(session, *args)
+            if result is None:
+                return None
+            return to_json(response_model, result), tags(result)
+
+        loaded = await run_db(db, load)
+        if loaded is None:
+            raise HTTPException(status_code=404, detail=not_found)
+        body, result_tags = loaded
+        # Если данные изменились во время запроса, ответ мог устареть - не кэшируем его
+        if data_versions.get(versions) == current_versions:
+            cache.set(key, body, result_tags)
+        cache_status = "MISS"
+
+    return etag_response(request, body, {"X-Cache": cache_status})
+
+
+def etag_response(request: Request, body: bytes, headers: Optional[dict] = None) -> Response:
+    """JSON-ответ с ETag - хэшем тела; при совпадении If-None-Match - 304 без тела"""
+    headers = {**(headers or {}), "ETag": make_etag(body)}
+    if etag_matches(request.headers.get("if-none-match"), headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    return Response(body, media_type="application/json", headers=headers)
+
+
+# Схемы ответа для каждого представления организаций (параметр view)
+ORGANIZATION_MODELS = {
+    schemas.OrganizationView.full: schemas.Organization,
+    schemas.OrganizationView.compact: schemas.OrganizationCompact,
+}
+ORGANIZATION_PAGE_MODELS = {
+    schemas.OrganizationView.full: schemas.OrganizationPage,
+    schemas.OrganizationView.compact: schemas.OrganizationCompactPage,
+}
+OrganizationPageResponse = Union[schemas.OrganizationPage, schemas.OrganizationCompactPage]
+VIEW_DESCRIPTION = "Представление: full - со зданием и деятельностями, compact - id, название и координаты"
+
+
+async def json_result(db: DbSession, fn, *args, response_model, request: Optional[Request] = None):
+    """Ответ crud-функции, сериализованный напрямую в JSON без повторной валидации FastAPI.
+
+    С request (некэшируемые GET) ответ получает ETag и условный 304; ответ
+    вычисляется целиком, ETag экономит только передачу тела.
+    """
+    body = await run_db_json(db, fn, *args, response_model=response_model)
+    if request is not None:
+        return etag_response(request, body)
+    return Response(body, media_type="application/json")
+
 
-# Все эндпоинты требуют API ключ
-@app.get("/organizations/by-building/{building_id}", response_model=List[schemas.Organization])
+@app.exception_handler(InvalidCursor)
+async def invalid_cursor_handler(request: Request, exc: InvalidCursor):
+    return JSONResponse(status_code=400, content={"detail": str(exc)})
+
+# Все эндпоинты требуют API ключ: чтение - право read, создание данных - write, управление ключами - admin
+@app.get("/organizations/by-building/{building_id}", response_model=OrganizationPageResponse)
 async def get_organizations_by_building(
+    request: Request,
     building_id: int,
-    api_key: str = Depends(verify_api_key),
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = Query(None, description="Курсор следующей страницы (next_cursor из предыдущего ответа)"),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE, description="Размер страницы"),
+    stream: bool = Query(False, description="Отдать все записи потоком NDJSON (без пагинации)"),
+    view: schemas.OrganizationView = Query(schemas.OrganizationView.full, description=VIEW_DESCRIPTION),
+    api_key: ApiKeyInfo = Depends(verify_api_key)
 ):
     """Получить все организации в конкретном здании"""
-    organizations = crud.get_organizations_by_building(db, building_id)
-    return organizations
+    if wants_stream(request, stream):
+        return ndjson_response(
+            lambda session: crud.iter_organizations(
+                crud.organizations_by_building_query(session, building_id), view=view.value
+            ),
+            ORGANIZATION_MODELS[view]
+        )
+    async with open_db() as db:
+        return await cached_response(
+            request, db, [f"building:{building_id}", "activities"],
+            lambda page: {f"building:{building_id}"} | organization_tags(page["organizations"]),
+            crud.get_organizations_by_building, building_id, cursor, limit, view.value,
+            response_model=ORGANIZATION_PAGE_MODELS[view]
+        )
 
-@app.get("/organizations/by-activity/{activity_id}", response_model=List[schemas.Organization])
+@app.get("/organizations/by-activity/{activity_id}", response_model=OrganizationPageResponse)
 async def get_organizations_by_activity(
+    request: Request,
     activity_id: int,
-    api_key: str = Depends(verify_api_key),
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = Query(None, description="Курсор следующей страницы (next_cursor из предыдущего ответа)"),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE, description="Размер страницы"),
+    stream: bool = Query(False, description="Отдать все записи потоком NDJSON (без пагинации)"),
+    view: schemas.OrganizationView = Query(schemas.OrganizationView.full, description=VIEW_DESCRIPTION),
+    api_key: ApiKeyInfo = Depends(verify_api_key)
 ):
     """Получить все организации по виду деятельности (включая дочерние виды)"""
-    organizations = crud.get_organizations_by_activity(db, activity_id)
-    return organizations
+    if wants_stream(request, stream):
+        return ndjson_response(
+            lambda session: crud.iter_organizations(
+                crud.organizations_by_activity_query(session, activity_id), view=view.value
+            ),
+            ORGANIZATION_MODELS[view]
+        )
+    async with open_db() as db:
+        return await cached_response(
+            request, db, [f"activity-orgs:{activity_id}", "activities"],
+            lambda page: {f"activity-orgs:{activity_id}"} | organization_tags(page["organizations"]),
+            crud.get_organizations_by_activity, activity_id, cursor, limit, view.value,
+            response_model=ORGANIZATION_PAGE_MODELS[view]
+        )
 
-@app.get("/organizations/in-radius", response_model=List[schemas.Organization])
+@app.get("/organizations/in-radius", response_model=OrganizationPageResponse)
 async def get_organizations_in_radius(
+    request: Request,
     latitude: float = Query(..., description="Широта центральной точки"),
     longitude: float = Query(..., description="Долгота центральной точки"),
     radius: float = Query(..., description="Радиус поиска в километрах"),
-    api_key: str = Depends(verify_api_key),
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = Query(None, description="Курсор следующей страницы (next_cursor из предыдущего ответа)"),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE, description="Размер страницы"),
+    stream: bool = Query(False, description="Отдать все записи потоком NDJSON (без пагинации)"),
+    view: schemas.OrganizationView = Query(schemas.OrganizationView.full, description=VIEW_DESCRIPTION),
+    api_key: ApiKeyInfo = Depends(verify_api_key)
 ):
-    """Получить организации в заданном радиусе от точки"""
-    organizations = crud.get_organizations_in_radius(db, latitude, longitude, radius)
-    return organizations
+    """Получить организации в заданном радиусе от точки (по возрастанию расстояния)"""
+    if wants_stream(request, stream):
+        return ndjson_response(
+            lambda session: crud.iter_organizations_in_radius(session, latitude, longitude, radius, view=view.value),
+            ORGANIZATION_MODELS[view]
+        )
+    async with open_db() as db:
+        return await json_result(
+            db, crud.get_organizations_in_radius, latitude, longitude, radius, cursor, limit, view.value,
+            response_model=ORGANIZATION_PAGE_MODELS[view], request=request
+        )
 
-@app.get("/organizations/in-rectangle", response_model=List[schemas.Organization])
+@app.get("/organizations/in-rectangle", response_model=OrganizationPageResponse)
 async def get_organizations_in_rectangle(
+    request: Request,
     min_lat: float = Query(..., description="Минимальная широта"),
     max_lat: float = Query(..., description="Максимальная широта"),
     min_lon: float = Query(..., description="Минимальная долгота"),
     max_lon: float = Query(..., description="Максимальная долгота"),
-    api_key: str = Depends(verify_api_key),
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = Query(None, description="Курсор следующей страницы (next_cursor из предыдущего ответа)"),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE, description="Размер страницы"),
+    stream: bool = Query(False, description="Отдать все записи потоком NDJSON (без пагинации)"),
+    view: schemas.OrganizationView = Query(schemas.OrganizationView.full, description=VIEW_DESCRIPTION),
+    api_key: ApiKeyInfo = Depends(verify_api_key)
 ):
     """Получить организации в прямоугольной области"""
-    organizations = crud.get_organizations_in_rectangle(db, min_lat, max_lat, min_lon, max_lon)
-    return organizations
+    if wants_stream(request, stream):
+        return ndjson_response(
+            lambda session: crud.iter_organizations(
+                crud.organizations_in_rectangle_query(session, min_lat, max_lat, min_lon, max_lon), view=view.value
+            ),
+            ORGANIZATION_MODELS[view]
+        )
+    async with open_db() as db:
+        return await json_result(
+            db, crud.get_organizations_in_rectangle, min_lat, max_lat, min_lon, max_lon, cursor, limit, view.value,
+            response_model=ORGANIZATION_PAGE_MODELS[view], request=request
+        )
 
-@app.get("/buildings", response_model=List[schemas.Building])
+@app.get("/buildings", response_model=schemas.BuildingPage)
 async def get_buildings(
-    api_key: str = Depends(verify_api_key),
-    db: Session = Depends(get_db)
+    request: Request,
+    cursor: Optional[str] = Query(None, description="Курсор следующей страницы (next_cursor из предыдущего ответа)"),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE, description="Размер страницы"),
+    stream: bool = Query(False, description="Отдать все записи потоком NDJSON (без пагинации)"),
+    api_key: ApiKeyInfo = Depends(verify_api_key)
 ):
     """Получить список всех зданий"""
-    buildings = crud.get_all_buildings(db)
-    return buildings
+    if wants_stream(request, stream):
+        return ndjson_response(crud.iter_buildings, schemas.Building)
+    async with open_db() as db:
+        return await cached_response(
+            request, db, ["buildings"], lambda page: {"buildings"},
+            crud.get_buildings, cursor, limit,
+            response_model=schemas.BuildingPage
+        )
 
-@app.get("/organizations/{organization_id}", response_model=schemas.Organization)
+@app.get("/organizations/{organization_id}", response_model=Union[schemas.Organization, schemas.OrganizationCompact])
 async def get_organization(
+    request: Request,
     organization_id: int,
-    api_key: str = Depends(verify_api_key),
-    db: Session = Depends(get_db)
+    view: schemas.OrganizationView = Query(schemas.OrganizationView.full, description=VIEW_DESCRIPTION),
+    api_key: ApiKeyInfo = Depends(verify_api_key),
+    db: DbSession = Depends(get_db)
 ):
     """Получить информацию об организации по ID"""
-    organization = crud.get_organization_by_id(db, organization_id)
-    if organization is None:
-        raise HTTPException(status_code=404, detail="Organization not found")
-    return organization
+    return await cached_response(
+        request, db, [f"organization:{organization_id}", "activities"],
+        lambda organization: {f"organization:{organization_id}"} | organization_tags([organization]),
+        crud.get_organization_by_id, organization_id, view.value,
+        response_model=ORGANIZATION_MODELS[view], not_found="Organization not found"
+    )
 
-@app.get("/organizations/search/by-name", response_model=List[schemas.Organization])
+@app.get("/organizations/search/by-name", response_model=OrganizationPageResponse)
 async def search_organizations_by_name(
+    request: Request,
     name: str = Query(..., description="Название организации для поиска"),
-    skip: int = Query(0, description="Количество пропускаемых записей"),
-    limit: int = Query(100, description="Максимальное количество результатов"),
-    api_key: str = Depends(verify_api_key),
-    db: Session = Depends(get_db)
+    ranked: bool = Query(False, description="Сортировать по релевантности (полнотекстовый поиск)"),
+    cursor: Optional[str] = Query(None, description="Курсор следующей страницы (next_cursor из предыдущего ответа)"),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE, description="Размер страницы"),
+    view: schemas.OrganizationView = Query(schemas.OrganizationView.full, description=VIEW_DESCRIPTION),
+    api_key: ApiKeyInfo = Depends(verify_api_key),
+    db: DbSession = Depends(get_db)
 ):
     """Поиск организаций по названию"""
-    organizations = crud.search_organizations_by_name(db, name, skip, limit)
-    return organizations
+    return await json_result(
+        db, crud.search_organizations_by_name, name, cursor, limit, ranked, view.value,
+        response_model=ORGANIZATION_PAGE_MODELS[view], request=request
+    )
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Метрики Prometheus (без API ключа, для сборщика метрик)"""
+    return metrics_response()
+
+@app.get("/health", include_in_schema=False)
+async def health():
+    """Liveness: процесс отвечает (без API ключа и обращений к БД)"""
+    return liveness()
+
+@app.get("/ready", include_in_schema=False)
+async def ready():
+    """Readiness: SELECT 1 с таймаутом, ревизия миграций, занятость пулов и состояние индексов в памяти"""
+    return await readiness_response()
+
+@app.get("/pool/stats", response_model=List[schemas.PoolStats])
+async def pool_stats(api_key: ApiKeyInfo = Depends(verify_api_key)):
+    """Состояние пулов соединений: занятые соединения, overflow, время ожидания соединения"""
+    return get_pool_stats()
 
 # Endpoints для создания данных (для тестирования)
 @app.post("/buildings", response_model=schemas.Building)
 async def create_building(
     building: schemas.BuildingCreate,
-    api_key: str = Depends(verify_api_key),
-    db: Session = Depends(get_db)
+    api_key: ApiKeyInfo = Depends(verify_write_api_key),
+    db: DbSession = Depends(get_db)
 ):
     """Создать новое здание"""
-    return crud.create_building(db, building)
+    return await json_result(db, crud.create_building, building, response_model=schemas.Building)
+
+@app.post("/buildings/bulk", response_model=schemas.BulkResult)
+async def create_buildings_bulk(
+    request: Request,
+    api_key: ApiKeyInfo = Depends(verify_write_api_key),
+    db: DbSession = Depends(get_db)
+):
+    """Массовая загрузка зданий: JSON-массив или NDJSON (Content-Type: application/x-ndjson)"""
+    return await run_bulk(request, db, schemas.BuildingCreate, crud.bulk_create_buildings)
 
 @app.post("/activities", response_model=schemas.Activity)
 async def create_activity(
     activity: schemas.ActivityCreate,
-    api_key: str = Depends(verify_api_key),
-    db: Session = Depends(get_db)
+    api_key: ApiKeyInfo = Depends(verify_write_api_key),
+    db: DbSession = Depends(get_db)
 ):
     """Создать новый вид деятельности"""
     try:
-        return crud.create_activity(db, activity)
+        return await json_result(db, crud.create_activity, activity, response_model=schemas.Activity)
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
 
+@app.post("/activities/bulk", response_model=schemas.BulkResult)
+async def create_activities_bulk(
+    request: Request,
+    api_key: ApiKeyInfo = Depends(verify_write_api_key),
+    db: DbSession = Depends(get_db)
+):
+    """Массовая загрузка видов деятельности (родители должны существовать заранее)"""
+    return await run_bulk(request, db, schemas.ActivityCreate, crud.bulk_create_activities)
+
 @app.post("/organizations", response_model=schemas.Organization)
 async def create_organization(
     organization: schemas.OrganizationCreate,
-    api_key: str = Depends(verify_api_key),
-    db: Session = Depends(get_db)
+    api_key: ApiKeyInfo = Depends(verify_write_api_key),
+    db: DbSession = Depends(get_db)
 ):
     """Создать новую организацию"""
-    return crud.create_organization(db, organization)
+    return await json_result(db, crud.create_organization, organization, response_model=schemas.Organization)
+
+@app.post("/organizations/bulk", response_model=schemas.BulkResult)
+async def create_organizations_bulk(
+    request: Request,
+    api_key: ApiKeyInfo = Depends(verify_write_api_key),
+    db: DbSession = Depends(get_db)
+):
+    """Массовая загрузка организаций со связями с видами деятельности"""
+    return await run_bulk(request, db, schemas.OrganizationCreate, crud.bulk_create_organizations)
+
+# Резервное копирование: полная выгрузка и восстановление справочника
+@app.get("/export", response_class=StreamingResponse)
+async def export_data(api_key: ApiKeyInfo = Depends(verify_admin_api_key)):
+    """Выгрузка зданий, деятельностей и организаций со связями в gzip NDJSON из одного снимка данных"""
+    return export_response()
+
+@app.post("/import", response_model=schemas.RestoreResult)
+async def import_data(
+    request: Request,
+    api_key: ApiKeyInfo = Depends(verify_admin_api_key),
+    db: DbSession = Depends(get_db)
+):
+    """Восстановление выгрузки /export в пустую базу (тело - gzip или несжатый NDJSON)"""
+    return await restore_export(request, db)
+
+@app.post("/api-keys", response_model=schemas.ApiKeyCreated)
+async def create_api_key(
+    api_key_data: schemas.ApiKeyCreate,
+    api_key: ApiKeyInfo = Depends(verify_admin_api_key),
+    db: DbSession = Depends(get_db)
+):
+    """Выпустить API ключ клиента. Ключ возвращается только в этом ответе, в БД хранится его хэш"""
+    key = generate_api_key()
+    created = await run_db(db, crud.create_api_key, api_key_data, hash_api_key(key), response_model=schemas.ApiKey)
+    return schemas.ApiKeyCreated(**created.model_dump(), key=key)
+
+@app.get("/api-keys", response_model=List[schemas.ApiKey])
+async def get_api_keys(
+    api_key: ApiKeyInfo = Depends(verify_admin_api_key),
+    db: DbSession = Depends(get_db)
+):
+    """Список API ключей (без самих ключей)"""
+    return await run_db(db, crud.get_api_keys, response_model=List[schemas.ApiKey])
+
+@app.delete("/api-keys/{api_key_id}", response_model=schemas.ApiKey)
+async def revoke_api_key(
+    api_key_id: int,
+    api_key: ApiKeyInfo = Depends(verify_admin_api_key),
+    db: DbSession = Depends(get_db)
+):
+    """Отозвать API ключ. В этом процессе сразу, в остальных - не позже API_KEY_CACHE_TTL секунд"""
+    revoked = await run_db(db, crud.revoke_api_key, api_key_id, response_model=schemas.ApiKey)
+    if revoked is None:
+        raise HTTPException(status_code=404, detail="API key not found")
+    api_key_cache.clear()
+    return revoked
 
 if __name__ == "__main__":
     import uvicorn
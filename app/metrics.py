@@ -0,0 +1,159 @@
+from fastapi import Response
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, REGISTRY, generate_latest, multiprocess
+)
+from starlette.datastructures import MutableHeaders
+from typing import Dict, Tuple
+from .database import track_queries
+import os
+import time
+
+# Каталог общих файлов метрик для нескольких воркеров (см. init.sh); без него метрики только этого процесса
+MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+
+# Метка для запросов, не попавших ни в один маршрут (404): сырые пути раздули бы число рядов
+UNMATCHED_ROUTE = "<unmatched>"
+
+REQUESTS = Counter(
+    "http_requests_total", "Количество HTTP запросов",
+    ["method", "route", "status"]
+)
+LATENCY = Histogram(
+    "http_request_duration_seconds", "Время обработки HTTP запроса",
+    ["method", "route"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+)
+RESPONSE_SIZE = Histogram(
+    "http_response_size_bytes", "Размер тела HTTP ответа",
+    ["method", "route"],
+    buckets=(256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+)
+IN_PROGRESS = Gauge(
+    "http_requests_in_progress", "Запросы в обработке",
+    ["method"],
+    multiprocess_mode="livesum"
+)
+
+
+class MetricsMiddleware:
+    """ASGI middleware: латентность, размер ответа, статусы и запросы в обработке.
+
+    Маршрут берется из шаблона пути (/organizations/{organization_id}), который
+    находит роутер, а не из сырого пути. Дочерние метрики с метками кэшируются,
+    поэтому на запрос приходится несколько обращений к словарю и счетчикам.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._routes: Dict[object, str] = {}
+        self._children: Dict[Tuple[str, str], Tuple[Histogram, Histogram]] = {}
+        self._counters: Dict[Tuple[str, str, str], Counter] = {}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status = 500
+        size = 0
+
+        async def send_wrapper(message):
+            nonlocal status, size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
+
+        in_progress = IN_PROGRESS.labels(method)
+        in_progress.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            in_progress.dec()
+            route = self._route(scope)
+            latency, response_size = self._histograms(method, route)
+            latency.observe(elapsed)
+            response_size.observe(size)
+            self._counter(method, route, str(status)).inc()
+
+    def _route(self, scope) -> str:
+        # Роутер Starlette записывает найденный endpoint в scope
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return UNMATCHED_ROUTE
+        route = self._routes.get(endpoint)
+        if route is None:
+            app = scope.get("app")
+            for candidate in getattr(app, "routes", ()):
+                if getattr(candidate, "endpoint", None) is endpoint:
+                    route = candidate.path
+                    break
+            else:
+                route = UNMATCHED_ROUTE
+            self._routes[endpoint] = route
+        return route
+
+    def _histograms(self, method: str, route: str) -> Tuple[Histogram, Histogram]:
+        children = self._children.get((method, route))
+        if children is None:
+            children = (LATENCY.labels(method, route), RESPONSE_SIZE.labels(method, route))
+            self._children[(method, route)] = children
+        return children
+
+    def _counter(self, method: str, route: str, status: str) -> Counter:
+        counter = self._counters.get((method, route, status))
+        if counter is None:
+            counter = REQUESTS.labels(method, route, status)
+            self._counters[(method, route, status)] = counter
+        return counter
+
+
+class QueryTimingMiddleware:
+    """ASGI middleware: SQL-запросы запроса в заголовках ответа.
+
+    Server-Timing: db;dur=<суммарное время, мс>;desc="<N> queries", db-slowest;dur=<мс>
+    X-DB-Query-Count: <N>
+    Запросы потоковой выдачи выполняются после отправки заголовков и в них не входят.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        with track_queries() as stats:
+            async def send_wrapper(message):
+                if message["type"] == "http.response.start":
+                    headers = MutableHeaders(scope=message)
+                    headers.append(
+                        "Server-Timing",
+                        f'db;dur={stats.total_time * 1000:.2f};desc="{stats.count} queries", '
+                        f"db-slowest;dur={stats.slowest_time * 1000:.2f}"
+                    )
+                    headers.append("X-DB-Query-Count", str(stats.count))
+                await send(message)
+
+            await self.app(scope, receive, send_wrapper)
+
+
+def metrics_response() -> Response:
+    """Метрики в текстовом формате Prometheus; при нескольких воркерах - сумма по всем процессам"""
+    if MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return Response(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
+
+
+def mark_process_dead():
+    """Убирает gauge завершившегося воркера из общей суммы"""
+    if MULTIPROC_DIR:
+        multiprocess.mark_process_dead(os.getpid())
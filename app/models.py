@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, ForeignKey, Table, Text
+from sqlalchemy import Column, Integer, String, Float, ForeignKey, Table, Text, JSON, Boolean, DateTime, func
 from sqlalchemy.orm import relationship
 from sqlalchemy.dialects.postgresql import ARRAY
 from .database import Base
@@ -45,9 +45,22 @@ class Organization(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, nullable=False, index=True)
-    phone_numbers = Column(ARRAY(String))  # Массив номеров телефонов
+    # Массив номеров телефонов (в SQLite для локальных тестов хранится как JSON)
+    phone_numbers = Column(ARRAY(String).with_variant(JSON(), "sqlite"))
     building_id = Column(Integer, ForeignKey('buildings.id'), nullable=False)
 
     # Связи
     building = relationship("Building", back_populates="organizations")
     activities = relationship("Activity", secondary=organization_activity, back_populates="organizations")
+
+
+class ApiKey(Base):
+    __tablename__ = "api_keys"
+
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String, nullable=False)
+    # SHA-256 ключа в hex: сам ключ не хранится и показывается только при создании
+    key_hash = Column(String(64), nullable=False, unique=True, index=True)
+    scopes = Column(ARRAY(String).with_variant(JSON(), "sqlite"), nullable=False)
+    enabled = Column(Boolean, nullable=False, default=True)
+    created_at = Column(DateTime, nullable=False, server_default=func.now())
@@ -0,0 +1,40 @@
+from typing import Optional, Sequence, Tuple
+import base64
+import json
+import os
+
+# Размер страницы по умолчанию и максимальный размер страницы
+DEFAULT_PAGE_SIZE = int(os.getenv("DEFAULT_PAGE_SIZE", "100"))
+MAX_PAGE_SIZE = int(os.getenv("MAX_PAGE_SIZE", "1000"))
+
+
+class InvalidCursor(ValueError):
+    """Курсор не удалось разобрать"""
+
+
+def encode_cursor(*values) -> str:
+    """Упаковывает ключ последней записи страницы в непрозрачную строку"""
+    raw = json.dumps(list(values), separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: Optional[str], types: Sequence[type]) -> Optional[Tuple]:
+    """Распаковывает курсор в кортеж значений указанных типов; None для первой страницы"""
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+        if not isinstance(values, list) or len(values) != len(types):
+            raise ValueError
+        return tuple(value_type(value) for value_type, value in zip(types, values))
+    except (ValueError, TypeError):
+        raise InvalidCursor("Некорректный курсор")
+
+
+def make_page(items: list, limit: int, key) -> Tuple[list, Optional[str]]:
+    """Отрезает страницу из limit + 1 записей и строит курсор следующей страницы"""
+    if len(items) <= limit:
+        return items, None
+    items = items[:limit]
+    return items, encode_cursor(*key(items[-1]))
@@ -1,5 +1,7 @@
 from pydantic import BaseModel, Field
 from typing import List, Optional
+from datetime import datetime
+from enum import Enum
 
 class BuildingBase(BaseModel):
     address: str
@@ -48,6 +50,79 @@ class Organization(OrganizationBase):
     class Config:
         from_attributes = True
 
-class OrganizationSearch(BaseModel):
+class OrganizationView(str, Enum):
+    full = "full"
+    compact = "compact"
+
+class OrganizationCompact(BaseModel):
+    id: int
+    name: str
+    building_id: int
+    latitude: float
+    longitude: float
+
+    class Config:
+        from_attributes = True
+
+class OrganizationPage(BaseModel):
     organizations: List[Organization]
-    total: int
+    next_cursor: Optional[str] = None
+
+class OrganizationCompactPage(BaseModel):
+    organizations: List[OrganizationCompact]
+    next_cursor: Optional[str] = None
+
+class BuildingPage(BaseModel):
+    buildings: List[Building]
+    next_cursor: Optional[str] = None
+
+class BulkError(BaseModel):
+    index: int
+    detail: str
+
+class BulkResult(BaseModel):
+    created: int
+    ids: List[Optional[int]]  # id созданной записи по порядку входных элементов, None - ошибка
+    errors: List[BulkError] = []
+
+class RestoreResult(BaseModel):
+    buildings: int
+    activities: int
+    organizations: int
+    organization_activities: int
+
+class PoolStats(BaseModel):
+    engine: str
+    pool: str
+    size: Optional[int] = None
+    checked_in: Optional[int] = None
+    checked_out: Optional[int] = None
+    overflow: Optional[int] = None
+    max_overflow: Optional[int] = None
+    checkouts: Optional[int] = None
+    timeouts: Optional[int] = None
+    wait_time_total: Optional[float] = None
+    wait_time_avg: Optional[float] = None
+    wait_time_max: Optional[float] = None
+
+class ApiKeyScope(str, Enum):
+    read = "read"
+    write = "write"
+    admin = "admin"
+
+class ApiKeyCreate(BaseModel):
+    name: str
+    scopes: List[ApiKeyScope] = [ApiKeyScope.read]
+
+class ApiKey(BaseModel):
+    id: int
+    name: str
+    scopes: List[ApiKeyScope]
+    enabled: bool
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
+
+class ApiKeyCreated(ApiKey):
+    key: str  # показывается только один раз
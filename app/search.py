@@ -0,0 +1,76 @@
+from sqlalchemy import Connection, Float, cast, func, literal_column, select, table, column, text
+from . import models
+
+# Конфигурация полнотекстового поиска PostgreSQL (без стемминга - названия организаций)
+TS_CONFIG = "simple"
+# Триграммный индекс FTS5 находит подстроки длиной от 3 символов
+MIN_FTS_QUERY_LENGTH = 3
+
+SQLITE_FTS_TABLE = "organizations_fts"
+# Единственное описание индекса FTS5: его применяют и миграция 002, и ensure_sqlite_fts
+SQLITE_FTS_DDL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS organizations_fts
+       USING fts5(name, content='organizations', content_rowid='id', tokenize='trigram')""",
+    """CREATE TRIGGER IF NOT EXISTS organizations_fts_ai AFTER INSERT ON organizations BEGIN
+           INSERT INTO organizations_fts(rowid, name) VALUES (new.id, new.name);
+       END""",
+    """CREATE TRIGGER IF NOT EXISTS organizations_fts_ad AFTER DELETE ON organizations BEGIN
+           INSERT INTO organizations_fts(organizations_fts, rowid, name) VALUES ('delete', old.id, old.name);
+       END""",
+    """CREATE TRIGGER IF NOT EXISTS organizations_fts_au AFTER UPDATE OF name ON organizations BEGIN
+           INSERT INTO organizations_fts(organizations_fts, rowid, name) VALUES ('delete', old.id, old.name);
+           INSERT INTO organizations_fts(rowid, name) VALUES (new.id, new.name);
+       END""",
+]
+SQLITE_FTS_REBUILD = "INSERT INTO organizations_fts(organizations_fts) VALUES ('rebuild')"
+
+# Выставляется при старте, если в SQLite доступен индекс FTS5
+sqlite_fts_ready = False
+
+organizations_fts = table(SQLITE_FTS_TABLE, column("rowid"), column(SQLITE_FTS_TABLE))
+
+
+def ensure_sqlite_fts(connection: Connection) -> bool:
+    """Создает индекс FTS5 для локальной SQLite-базы (идемпотентно)"""
+    global sqlite_fts_ready
+    exists = connection.execute(
+        text("SELECT 1 FROM sqlite_master WHERE name = :name"), {"name": SQLITE_FTS_TABLE}
+    ).first() is not None
+    try:
+        for statement in SQLITE_FTS_DDL:
+            connection.execute(text(statement))
+        if not exists:
+            connection.execute(text(SQLITE_FTS_REBUILD))
+    except Exception:
+        # Сборка SQLite без FTS5 или без триграммного токенизатора - остается ILIKE
+        sqlite_fts_ready = False
+        return False
+    sqlite_fts_ready = True
+    return True
+
+
+def use_sqlite_fts(dialect_name: str, name: str) -> bool:
+    return dialect_name == "sqlite" and sqlite_fts_ready and len(name) >= MIN_FTS_QUERY_LENGTH
+
+
+def sqlite_fts_matches(name: str):
+    """Подзапрос (rowid, score) по индексу FTS5; score больше - релевантнее"""
+    phrase = '"' + name.replace('"', '""') + '"'
+    return select(
+        organizations_fts.c.rowid.label("organization_id"),
+        (-func.bm25(literal_column(SQLITE_FTS_TABLE))).label("score")
+    ).where(literal_column(SQLITE_FTS_TABLE).op("MATCH")(phrase)).subquery()
+
+
+def postgres_ts_vector():
+    """Выражение, по которому построен GIN-индекс ix_organizations_name_tsv"""
+    return func.to_tsvector(literal_column(f"'{TS_CONFIG}'::regconfig"), models.Organization.name)
+
+
+def postgres_ts_rank(ts_vector, ts_query):
+    """ts_rank в double precision: float4 при сравнении с параметром курсора (float8) не совпал бы сам с собой"""
+    return cast(func.ts_rank(ts_vector, ts_query), Float(precision=53))
+
+
+def postgres_ts_query(name: str):
+    return func.plainto_tsquery(literal_column(f"'{TS_CONFIG}'::regconfig"), name)
@@ -0,0 +1,109 @@
+from typing import Optional
+from . import schemas
+from .database import DbSession, run_db, type_adapter
+import json
+
+try:
+    import orjson
+except ImportError:  # без orjson - сериализация через pydantic
+    orjson = None
+
+
+# Прямые сериализаторы ORM-объектов и строк в словари схем ответа. Порядок ключей
+# совпадает с порядком полей схем (сначала поля базового класса), поэтому JSON
+# получается байт в байт тем же, что и у pydantic (dump_json), но без валидации
+# каждого объекта. От прежнего ответа FastAPI (jsonable_encoder + JSONResponse)
+# отличается только запись очень малых и больших float: 1e-6 и 0.00001 вместо
+# 1e-06 и 1e-05, 1e16 вместо 1e+16 - значения те же.
+
+def building_dict(building) -> dict:
+    return {
+        "address": building.address,
+        "latitude": float(building.latitude),
+        "longitude": float(building.longitude),
+        "id": building.id,
+    }
+
+
+def activity_dict(activity) -> dict:
+    return {
+        "name": activity.name,
+        "parent_id": activity.parent_id,
+        "level": activity.level,
+        "id": activity.id,
+        "children": [activity_dict(child) for child in activity.children],
+    }
+
+
+def organization_dict(organization) -> dict:
+    return {
+        "name": organization.name,
+        "phone_numbers": list(organization.phone_numbers or []),
+        "building_id": organization.building_id,
+        "id": organization.id,
+        "building": building_dict(organization.building),
+        "activities": [activity_dict(activity) for activity in organization.activities],
+    }
+
+
+def organization_compact_dict(row) -> dict:
+    return {
+        "id": row.id,
+        "name": row.name,
+        "building_id": row.building_id,
+        "latitude": float(row.latitude),
+        "longitude": float(row.longitude),
+    }
+
+
+ITEM_SERIALIZERS = {
+    schemas.Building: building_dict,
+    schemas.Activity: activity_dict,
+    schemas.Organization: organization_dict,
+    schemas.OrganizationCompact: organization_compact_dict,
+}
+
+# Страница: ключ списка и сериализатор элемента
+PAGE_SERIALIZERS = {
+    schemas.BuildingPage: ("buildings", building_dict),
+    schemas.OrganizationPage: ("organizations", organization_dict),
+    schemas.OrganizationCompactPage: ("organizations", organization_compact_dict),
+}
+
+
+def to_json(response_model, value) -> bytes:
+    """JSON ответа схемы response_model из ORM-объекта, строки или страницы crud.
+
+    Для известных схем объект сразу превращается в словарь и кодируется orjson,
+    для остальных (или без orjson) - валидация в схему и model_dump_json.
+    Вызывать внутри сессии: ленивые связи читаются при сериализации.
+    """
+    if orjson is not None:
+        if response_model in ITEM_SERIALIZERS:
+            return orjson.dumps(ITEM_SERIALIZERS[response_model](value))
+        if response_model in PAGE_SERIALIZERS:
+            key, serialize = PAGE_SERIALIZERS[response_model]
+            return orjson.dumps({
+                key: [serialize(item) for item in value[key]],
+                "next_cursor": value["next_cursor"],
+            })
+    adapter = type_adapter(response_model)
+    return adapter.dump_json(adapter.validate_python(value, from_attributes=True))
+
+
+def dumps(value) -> bytes:
+    """Компактный JSON словаря из примитивов (orjson или стандартный json)"""
+    if orjson is not None:
+        return orjson.dumps(value)
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+async def run_db_json(db: DbSession, fn, *args, response_model, **kwargs) -> Optional[bytes]:
+    """Как run_db, но сразу возвращает JSON ответа (None, если crud-функция вернула None)"""
+    def call(session):
+        result = fn(session, *args, **kwargs)
+        if result is None:
+            return None
+        return to_json(response_model, result)
+
+    return await run_db(db, call)
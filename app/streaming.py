@@ -0,0 +1,36 @@
+from fastapi import Request
+from fastapi.responses import StreamingResponse
+from typing import Callable, Iterable
+from .database import SessionLocal
+from .serialization import to_json
+import os
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+# Сколько объектов склеивать в один фрагмент ответа
+STREAM_CHUNK_SIZE = int(os.getenv("STREAM_CHUNK_SIZE", "100"))
+
+
+def wants_stream(request: Request, stream: bool) -> bool:
+    """Потоковый режим включается параметром ?stream=1 или заголовком Accept: application/x-ndjson"""
+    return stream or NDJSON_MEDIA_TYPE in request.headers.get("accept", "")
+
+
+def ndjson_response(produce: Callable[..., Iterable], schema) -> StreamingResponse:
+    """NDJSON-ответ: по одному сериализованному объекту schema на строку.
+
+    produce(db) возвращает итератор ORM-объектов (обычно с yield_per). Генератор
+    работает в пуле потоков со своей синхронной сессией, поэтому в памяти
+    держится только текущая пачка строк.
+    """
+    def generate():
+        with SessionLocal() as db:
+            chunk = []
+            for item in produce(db):
+                chunk.append(to_json(schema, item))
+                if len(chunk) >= STREAM_CHUNK_SIZE:
+                    yield b"\n".join(chunk) + b"\n"
+                    chunk = []
+            if chunk:
+                yield b"\n".join(chunk) + b"\n"
+
+    return StreamingResponse(generate(), media_type=NDJSON_MEDIA_TYPE)
@@ -0,0 +1,51 @@
+from typing import Dict, Iterable, Optional, Tuple
+import hashlib
+import threading
+
+
+class DataVersions:
+    """Счетчики версий данных по таблицам и сущностям ("buildings", "building:5", ...).
+
+    crud-функции создания увеличивают счетчики затронутых данных; ответ,
+    во время вычисления которого счетчики изменились, не попадает в кэш.
+    """
+
+    def __init__(self):
+        self._counters: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def bump(self, names: Iterable[str]):
+        with self._lock:
+            for name in names:
+                self._counters[name] = self._counters.get(name, 0) + 1
+
+    def get(self, names: Iterable[str]) -> Tuple[int, ...]:
+        return tuple(self._counters.get(name, 0) for name in names)
+
+
+data_versions = DataVersions()
+
+
+def make_etag(body: bytes) -> str:
+    """Слабый ETag по содержимому ответа.
+
+    Одинаковые ответы разных воркеров получают одинаковый ETag, и он меняется
+    вместе с данными независимо от того, какой процесс их записал.
+    """
+    return 'W/"' + hashlib.sha1(body).hexdigest()[:20] + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Проверка заголовка If-None-Match (список ETag или *); вызывать только для существующего ресурса"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    weak = etag[2:] if etag.startswith("W/") else etag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == weak:
+            return True
+    return False
@@ -0,0 +1,91 @@
+from sqlalchemy import or_
+from typing import Iterable, List, Tuple
+import os
+import threading
+import time
+
+# Сколько секунд перечитывать пропуски в id: строка с меньшим id может закоммититься
+# позже строки с большим (параллельные транзакции в PostgreSQL)
+GAP_RETENTION = float(os.getenv("INDEX_SYNC_GAP_SECONDS", "300"))
+# Максимум отслеживаемых пропусков; лишние отбрасываются, начиная с самых старых id
+MAX_GAPS = int(os.getenv("INDEX_SYNC_MAX_GAPS", "200"))
+
+
+class IdWatermark:
+    """Граница инкрементальной синхронизации таблицы по id.
+
+    Двигается только по строкам, прочитанным из БД (локальные вставки процесса
+    её не сдвигают). Пропущенные диапазоны id ниже границы запоминаются и
+    перечитываются GAP_RETENTION секунд: так подхватываются строки, которые
+    закоммитились позже строк с большими id. Транзакция дольше GAP_RETENTION
+    будет пропущена до полной перестройки индекса.
+    """
+
+    def __init__(self, gap_retention: float = GAP_RETENTION, max_gaps: int = MAX_GAPS):
+        self.gap_retention = gap_retention
+        self.max_gaps = max_gaps
+        self.max_id = 0
+        self._gaps: List[Tuple[int, int, float]] = []  # (первый id, последний id, когда замечен)
+
+    def reset(self):
+        self.max_id = 0
+        self._gaps = []
+
+    def condition(self, column):
+        """Условие на строки, которые надо прочитать: новее границы или в незакрытых пропусках"""
+        self._expire()
+        return or_(column > self.max_id, *(column.between(first, last) for first, last, _ in self._gaps))
+
+    def advance(self, ids: Iterable[int]):
+        """Сдвигает границу по id строк, прочитанных по condition(), и запоминает новые пропуски"""
+        now = time.monotonic()
+        previous = self.max_id
+        for row_id in sorted(row_id for row_id in ids if row_id > self.max_id):
+            if row_id > previous + 1:
+                self._gaps.append((previous + 1, row_id - 1, now))
+            previous = row_id
+        self.max_id = previous
+        if len(self._gaps) > self.max_gaps:
+            self._gaps = self._gaps[-self.max_gaps:]
+
+    def _expire(self):
+        deadline = time.monotonic() - self.gap_retention
+        self._gaps = [gap for gap in self._gaps if gap[2] >= deadline]
+
+
+class RefreshGate:
+    """Периодическая догрузка индекса: не чаще interval секунд и не больше одной за раз.
+
+    Проверка срока и отметка о начале синхронизации идут под коротким замком
+    без обращений к БД, поэтому повторная проверка внутри замка работает и
+    для потоков пула, и для гринлетов AsyncSession.run_sync на потоке цикла
+    событий (RLock индекса там повторно входим и параллельные синхронизации
+    не останавливает). Вызов, не получивший права, не ждет и работает с
+    текущим индексом.
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.synced_at = 0.0
+        self._running = False
+        self._lock = threading.Lock()
+
+    def _due(self) -> bool:
+        return not self._running and time.monotonic() - self.synced_at >= self.interval
+
+    def begin(self) -> bool:
+        """True, если синхронизировать должен вызывающий; после синхронизации - обязательно end()"""
+        if not self._due():
+            return False
+        with self._lock:
+            if not self._due():
+                return False
+            self._running = True
+            return True
+
+    def end(self):
+        self._running = False
+
+    def synced(self):
+        """Отмечает завершенную синхронизацию (в том числе полную перестройку)"""
+        self.synced_at = time.monotonic()
@@ -1,3 +1,4 @@
+#!/bin/sh
 set -e
 
 echo "🚀 Инициализация приложения..."
@@ -28,6 +29,53 @@ except Exception as e:
 "
 }
 
+# Режим запуска: production - несколько воркеров без слежения за файлами, development - один процесс с --reload
+SERVER_MODE=${SERVER_MODE:-production}
+HOST=${HOST:-0.0.0.0}
+PORT=${PORT:-8000}
+
+# Запуск сервера приложения
+start_server() {
+    # Файлы метрик прошлых запусков исказили бы суммы по воркерам
+    if [ -n "$PROMETHEUS_MULTIPROC_DIR" ]; then
+        echo "📊 Очистка каталога метрик..."
+        rm -rf "$PROMETHEUS_MULTIPROC_DIR"
+        mkdir -p "$PROMETHEUS_MULTIPROC_DIR"
+    fi
+
+    if [ "$SERVER_MODE" = "development" ]; then
+        echo "🎯 Запуск приложения (development, --reload)..."
+        exec uvicorn app.main:app --host "$HOST" --port "$PORT" --reload
+    fi
+
+    # Воркеров по числу доступных ядер; каждый держит свои пулы соединений с БД
+    WORKERS=${WEB_CONCURRENCY:-$(nproc)}
+    # Дольше таймаута простоя балансировщика (у nginx и ALB - 60 сек), чтобы соединение не закрывал сервер
+    KEEP_ALIVE=${UVICORN_KEEP_ALIVE:-65}
+    BACKLOG=${UVICORN_BACKLOG:-2048}
+    # Сколько секунд дождаться активных запросов при остановке (docker stop_grace_period должен быть больше)
+    GRACEFUL_TIMEOUT=${UVICORN_GRACEFUL_TIMEOUT:-30}
+
+    # uvloop и httptools ставятся с uvicorn[standard]; без них - стандартные asyncio и h11
+    LOOP=asyncio
+    HTTP=h11
+    if python -c "import uvloop" 2>/dev/null; then LOOP=uvloop; fi
+    if python -c "import httptools" 2>/dev/null; then HTTP=httptools; fi
+
+    # Лог каждого запроса стоит заметной доли пропускной способности; латентность видна в /metrics
+    ACCESS_LOG=--no-access-log
+    if [ "${UVICORN_ACCESS_LOG:-false}" = "true" ]; then ACCESS_LOG=--access-log; fi
+
+    echo "🎯 Запуск приложения (production): воркеров $WORKERS, $LOOP/$HTTP, keep-alive ${KEEP_ALIVE} сек"
+    exec uvicorn app.main:app --host "$HOST" --port "$PORT" \
+        --workers "$WORKERS" \
+        --loop "$LOOP" --http "$HTTP" \
+        --timeout-keep-alive "$KEEP_ALIVE" \
+        --backlog "$BACKLOG" \
+        --timeout-graceful-shutdown "$GRACEFUL_TIMEOUT" \
+        $ACCESS_LOG
+}
+
 # Основной процесс инициализации
 main() {
     wait_for_db
@@ -35,13 +83,14 @@ main() {
     
     echo "📦 Применение миграций..."
     alembic upgrade head
-    
-    echo "🎯 Запуск приложения..."
-    exec uvicorn app.main:app --host 0.0.0.0 --port 8000 --reload
+
+    start_server
 }
 
-# Запуск с обработкой ошибок
-if ! main; then
+# serve - только запуск сервера, без ожидания БД и миграций (локальный запуск)
+if [ "$1" = "serve" ]; then
+    start_server
+elif ! main; then
     echo "❌ Ошибка при инициализации приложения"
     exit 1
-fi
\ No newline at end of file
+fi
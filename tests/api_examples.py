@@ -21,7 +21,7 @@ def test_all_endpoints():
     print("1. Получение списка всех зданий:")
     response = requests.get(f"{BASE_URL}/buildings", headers=HEADERS)
     if response.status_code == 200:
-        buildings = response.json()
+        buildings = response.json()["buildings"]
         print(f"   Найдено зданий: {len(buildings)}")
         for building in buildings[:2]:  # Показываем первые 2
             print(f"   - {building['address']} (ID: {building['id']})")
@@ -33,7 +33,7 @@ def test_all_endpoints():
     print("2. Поиск организаций в здании ID=1:")
     response = requests.get(f"{BASE_URL}/organizations/by-building/1", headers=HEADERS)
     if response.status_code == 200:
-        organizations = response.json()
+        organizations = response.json()["organizations"]
         print(f"   Найдено организаций: {len(organizations)}")
         for org in organizations:
             print(f"   - {org['name']} (тел: {', '.join(org['phone_numbers'])})")
@@ -45,7 +45,7 @@ def test_all_endpoints():
     print("3. Поиск организаций по виду деятельности 'Еда' (ID=1, включая дочерние):")
     response = requests.get(f"{BASE_URL}/organizations/by-activity/1", headers=HEADERS)
     if response.status_code == 200:
-        organizations = response.json()
+        organizations = response.json()["organizations"]
         print(f"   Найдено организаций: {len(organizations)}")
         for org in organizations:
             activities = [act['name'] for act in org['activities']]
@@ -63,7 +63,7 @@ def test_all_endpoints():
     }
     response = requests.get(f"{BASE_URL}/organizations/in-radius", headers=HEADERS, params=params)
     if response.status_code == 200:
-        organizations = response.json()
+        organizations = response.json()["organizations"]
         print(f"   Найдено организаций: {len(organizations)}")
         for org in organizations:
             building = org['building']
@@ -82,7 +82,7 @@ def test_all_endpoints():
     }
     response = requests.get(f"{BASE_URL}/organizations/in-rectangle", headers=HEADERS, params=params)
     if response.status_code == 200:
-        organizations = response.json()
+        organizations = response.json()["organizations"]
         print(f"   Найдено организаций: {len(organizations)}")
         for org in organizations:
             building = org['building']
@@ -96,7 +96,7 @@ def test_all_endpoints():
     params = {"name": "Рога"}
     response = requests.get(f"{BASE_URL}/organizations/search/by-name", headers=HEADERS, params=params)
     if response.status_code == 200:
-        organizations = response.json()
+        organizations = response.json()["organizations"]
         print(f"   Найдено организаций: {len(organizations)}")
         for org in organizations:
             print(f"   - {org['name']}")
@@ -1,8 +1,12 @@
 """
 Утилиты для резервного копирования и восстановления данных
+
+Резервная копия - выгрузка /export (gzip NDJSON): файл пишется и читается
+потоково, поэтому память не зависит от объема справочника.
 """
 
 import requests
+import gzip
 import json
 from datetime import datetime
 import os
@@ -11,61 +15,67 @@ API_KEY = "your-secret-api-key-here"
 BASE_URL = "http://localhost:8000"
 HEADERS = {
     "Authorization": f"Bearer {API_KEY}",
-    "Content-Type": "application/json"
 }
+BACKUP_SUFFIX = ".ndjson.gz"
+CHUNK_SIZE = 1024 * 1024
 
 
 def backup_data():
     """Создает резервную копию всех данных"""
-    backup_data = {
-        "timestamp": datetime.now().isoformat(),
-        "buildings": [],
-        "organizations": []
-    }
-
+    filename = f"backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}{BACKUP_SUFFIX}"
     print("Создание резервной копии данных...")
 
-    # Сохраняем здания
-    try:
-        response = requests.get(f"{BASE_URL}/buildings", headers=HEADERS)
-        if response.status_code == 200:
-            backup_data["buildings"] = response.json()
-            print(f"✅ Сохранено зданий: {len(backup_data['buildings'])}")
-        else:
-            print(f"❌ Ошибка получения зданий: {response.status_code}")
-    except Exception as e:
-        print(f"❌ Ошибка при получении зданий: {e}")
-
-    # Сохраняем все организации (через поиск по пустому названию)
-    try:
-        response = requests.get(f"{BASE_URL}/organizations/search/by-name?name=&limit=1000", headers=HEADERS)
-        if response.status_code == 200:
-            organizations = response.json()
-            backup_data["organizations"] = organizations
-            print(f"✅ Сохранено организаций: {len(organizations)}")
-        else:
-            print(f"❌ Ошибка получения организаций: {response.status_code}")
-    except Exception as e:
-        print(f"❌ Ошибка при получении организаций: {e}")
-
-    # Сохраняем в файл
-    filename = f"backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
-    with open(filename, 'w', encoding='utf-8') as f:
-        json.dump(backup_data, f, ensure_ascii=False, indent=2)
-
-    print(f"💾 Резервная копия сохранена в {filename}")
+    size = 0
+    with requests.get(f"{BASE_URL}/export", headers=HEADERS, stream=True) as response:
+        response.raise_for_status()
+        with open(filename, 'wb') as f:
+            for chunk in response.iter_content(CHUNK_SIZE):
+                f.write(chunk)
+                size += len(chunk)
+
+    print(f"💾 Резервная копия сохранена в {filename} ({size / 1024 / 1024:.1f} МБ)")
+    show_backup_info(filename, examples=False)
     return filename
 
 
+def restore_data(filename):
+    """Восстанавливает резервную копию в пустую базу"""
+    print(f"Восстановление из {filename}...")
+    with open(filename, 'rb') as f:
+        # Файл отправляется потоково, частями, а не читается в память целиком
+        response = requests.post(
+            f"{BASE_URL}/import", headers={**HEADERS, "Content-Type": "application/gzip"}, data=f
+        )
+
+    if response.status_code != 200:
+        print(f"❌ Ошибка восстановления ({response.status_code}): {response.json().get('detail')}")
+        return None
+
+    result = response.json()
+    print(f"✅ Восстановлено зданий: {result['buildings']}")
+    print(f"✅ Восстановлено видов деятельности: {result['activities']}")
+    print(f"✅ Восстановлено организаций: {result['organizations']}")
+    print(f"✅ Восстановлено связей с деятельностью: {result['organization_activities']}")
+    return result
+
+
+def iter_backup_records(filename):
+    """Записи резервной копии по одной"""
+    with gzip.open(filename, 'rt', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
 def list_backups():
     """Показывает список доступных резервных копий"""
-    backup_files = [f for f in os.listdir('..') if f.startswith('backup_') and f.endswith('.json')]
+    backup_files = [f for f in os.listdir('.') if f.startswith('backup_') and f.endswith(BACKUP_SUFFIX)]
     backup_files.sort(reverse=True)  # Сортируем по убыванию (новые сначала)
 
     print("Доступные резервные копии:")
     for i, filename in enumerate(backup_files, 1):
         # Извлекаем дату из имени файла
-        date_str = filename.replace('backup_', '').replace('.json', '')
+        date_str = filename.replace('backup_', '').replace(BACKUP_SUFFIX, '')
         try:
             date_obj = datetime.strptime(date_str, '%Y%m%d_%H%M%S')
             formatted_date = date_obj.strftime('%Y-%m-%d %H:%M:%S')
@@ -76,31 +86,46 @@ def list_backups():
     return backup_files
 
 
-def show_backup_info(filename):
+def show_backup_info(filename, examples=True):
     """Показывает информацию о резервной копии"""
+    counts = {"building": 0, "activity": 0, "organization": 0}
+    samples = {"building": [], "organization": []}
+    header = footer = None
     try:
-        with open(filename, 'r', encoding='utf-8') as f:
-            backup_data = json.load(f)
+        for record in iter_backup_records(filename):
+            record_type = record.get("type")
+            if record_type == "header":
+                header = record
+            elif record_type == "end":
+                footer = record
+            elif record_type in counts:
+                counts[record_type] += 1
+                if record_type in samples and len(samples[record_type]) < 3:
+                    samples[record_type].append(record)
+    except (OSError, ValueError) as e:
+        print(f"❌ Ошибка чтения файла: {e}")
+        return
 
-        print(f"\nИнформация о резервной копии: {filename}")
-        print(f"Дата создания: {backup_data.get('timestamp', 'Неизвестно')}")
-        print(f"Зданий: {len(backup_data.get('buildings', []))}")
-        print(f"Организаций: {len(backup_data.get('organizations', []))}")
+    print(f"\nИнформация о резервной копии: {filename}")
+    print(f"Дата создания: {header.get('created_at', 'Неизвестно') if header else 'Неизвестно'}")
+    print(f"Зданий: {counts['building']}")
+    print(f"Видов деятельности: {counts['activity']}")
+    print(f"Организаций: {counts['organization']}")
+    if footer is None:
+        print("⚠️ Копия неполная: нет завершающей записи")
 
+    if examples:
         # Показываем примеры данных
-        if backup_data.get('buildings'):
+        if samples['building']:
             print("\nПримеры зданий:")
-            for building in backup_data['buildings'][:3]:
+            for building in samples['building']:
                 print(f"  - {building['address']}")
 
-        if backup_data.get('organizations'):
+        if samples['organization']:
             print("\nПримеры организаций:")
-            for org in backup_data['organizations'][:3]:
+            for org in samples['organization']:
                 print(f"  - {org['name']}")
 
-    except Exception as e:
-        print(f"❌ Ошибка чтения файла: {e}")
-
 
 if __name__ == "__main__":
     import sys
@@ -108,6 +133,11 @@ if __name__ == "__main__":
     if len(sys.argv) > 1:
         if sys.argv[1] == "backup":
             backup_data()
+        elif sys.argv[1] == "restore":
+            if len(sys.argv) > 2:
+                restore_data(sys.argv[2])
+            else:
+                print("Укажите файл резервной копии")
         elif sys.argv[1] == "list":
             list_backups()
         elif sys.argv[1] == "info":
@@ -121,6 +151,7 @@ if __name__ == "__main__":
                     print("Резервные копии не найдены")
     else:
         print("Использование:")
-        print("  python backup_restore.py backup     - создать резервную копию")
-        print("  python backup_restore.py list       - показать список копий")
-        print("  python backup_restore.py info <файл>- показать информацию о копии")
\ No newline at end of file
+        print("  python backup_restore.py backup          - создать резервную копию")
+        print("  python backup_restore.py restore <файл>  - восстановить копию в пустую базу")
+        print("  python backup_restore.py list            - показать список копий")
+        print("  python backup_restore.py info <файл>     - показать информацию о копии")
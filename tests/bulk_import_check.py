@@ -0,0 +1,106 @@
+"""
+Проверка пакетного импорта деятельностей (crud.bulk_create_activities)
+
+Родитель и потомок в одном запросе должны создаваться при размере пачки по
+умолчанию так же, как при BULK_CHUNK_SIZE=1: результат не зависит от того,
+где тело запроса разбито на пачки.
+
+    python bulk_import_check.py
+"""
+
+import os
+import sys
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ.setdefault("DB_MODE", "sync")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import StaticPool
+
+from app import crud, models, schemas
+from app.activity_tree import activity_closure
+
+NOT_FOUND = "Родительская деятельность не найдена"
+TOO_DEEP = f"Максимальный уровень вложенности - {crud.MAX_ACTIVITY_LEVEL}"
+
+
+def make_session():
+    db_engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+    models.Base.metadata.create_all(bind=db_engine)
+    db = Session(db_engine)
+    activity_closure.rebuild(db)
+    return db
+
+
+def import_activities(items, chunk_size=None):
+    """Импорт на чистой базе: одной пачкой или пачками по chunk_size, как run_bulk"""
+    with make_session() as db:
+        activities = [schemas.ActivityCreate(**item) for item in items]
+        chunk_size = chunk_size or len(activities)
+        results = []
+        for start in range(0, len(activities), chunk_size):
+            results += crud.bulk_create_activities(db, activities[start:start + chunk_size])
+        levels = dict(db.query(models.Activity.id, models.Activity.level))
+    return results, levels
+
+
+def check_parent_and_child():
+    """Родитель и потомок в одной пачке"""
+    results, levels = import_activities([{"name": "root"}, {"name": "child", "parent_id": 1}])
+    assert results == [1, 2], results
+    assert levels == {1: 1, 2: 2}, levels
+
+
+def check_three_levels():
+    """Три уровня и соседние корни в одной пачке, четвертый уровень отклоняется"""
+    results, levels = import_activities([
+        {"name": "Еда"},
+        {"name": "Автомобили"},
+        {"name": "Мясная продукция", "parent_id": 1},
+        {"name": "Грузовые", "parent_id": 2},
+        {"name": "Колбасы", "parent_id": 3},
+        {"name": "Слишком глубоко", "parent_id": 5},
+    ])
+    assert results == [1, 2, 3, 4, 5, TOO_DEEP], results
+    assert levels == {1: 1, 2: 1, 3: 2, 4: 2, 5: 3}, levels
+
+
+def check_chunk_size_independent():
+    """Результат одной пачки совпадает с пачками по одной строке"""
+    items = [
+        {"name": "Потомок раньше родителя", "parent_id": 1},
+        {"name": "root"},
+        {"name": "child", "parent_id": 1},
+        {"name": "Нет родителя", "parent_id": 100},
+        {"name": "grandchild", "parent_id": 2},
+    ]
+    whole = import_activities(items)
+    assert whole == import_activities(items, chunk_size=1), whole
+    assert whole[0] == [NOT_FOUND, 1, 2, NOT_FOUND, 3], whole[0]
+
+
+CHECKS = [
+    check_parent_and_child,
+    check_three_levels,
+    check_chunk_size_independent,
+]
+
+
+def main():
+    print("=== Проверка пакетного импорта деятельностей ===\n")
+    failures = 0
+    for check in CHECKS:
+        try:
+            check()
+            print(f"✅ {check.__doc__}")
+        except AssertionError as e:
+            failures += 1
+            print(f"❌ {check.__doc__}: {e}")
+    print(f"\nОшибок: {failures}")
+    return failures
+
+
+if __name__ == "__main__":
+    sys.exit(1 if main() else 0)
@@ -0,0 +1,225 @@
+"""
+Микробенчмарки crud-функций и сериализации без HTTP и uvicorn
+
+Для каждого размера набора данных создается локальная SQLite-база (seed_database.py,
+создается один раз и переиспользуется, пока не изменились параметры генерации,
+код генератора или схема таблиц). Для каждой функции меряются время,
+число SQL-запросов и пиковая память (tracemalloc).
+
+    python crud_benchmark.py --sizes 1k,10k,100k --save-baseline benchmark_baseline.json
+    python crud_benchmark.py --sizes 1k,10k,100k --baseline benchmark_baseline.json
+
+С --baseline скрипт завершается с кодом 1 при регрессии: больше SQL-запросов,
+чем в базовом прогоне, или рост времени / памяти выше порогов.
+"""
+
+import argparse
+import glob
+import hashlib
+import inspect
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ.setdefault("DB_MODE", "sync")
+os.environ.setdefault("SLOW_QUERY_MS", "inf")
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import create_engine
+from sqlalchemy.dialects import sqlite
+from sqlalchemy.schema import CreateTable
+from sqlalchemy.orm import Session
+
+import seed_database
+from seed_database import seed_dataset
+from app import crud, models, schemas, search
+from app.activity_tree import activity_closure
+from app.database import instrument_engine, track_queries
+from app.geo_index import building_index
+from app.serialization import to_json
+
+# Размеры наборов: число организаций и зданий
+SIZES = {
+    "1k": (1_000, 100),
+    "10k": (10_000, 1_000),
+    "100k": (100_000, 10_000),
+    "1m": (1_000_000, 100_000),
+}
+
+MOSCOW = (55.7558, 37.6176)
+
+
+def benchmark_cases():
+    """Имя -> функция от сессии. Параметры подобраны под данные seed_database.py"""
+    return {
+        "get_buildings": lambda db: crud.get_buildings(db, limit=100),
+        "get_organization_by_id": lambda db: crud.get_organization_by_id(db, 1),
+        "get_organizations_by_building": lambda db: crud.get_organizations_by_building(db, 1),
+        "get_organizations_by_activity": lambda db: crud.get_organizations_by_activity(db, 1, limit=100),
+        "get_organizations_by_activity_compact": lambda db: crud.get_organizations_by_activity(
+            db, 1, limit=100, view="compact"
+        ),
+        "get_organizations_in_radius": lambda db: crud.get_organizations_in_radius(db, *MOSCOW, 2, limit=100),
+        "get_organizations_in_radius_wide": lambda db: crud.get_organizations_in_radius(db, *MOSCOW, 50, limit=100),
+        "get_organizations_in_rectangle": lambda db: crud.get_organizations_in_rectangle(
+            db, 55.70, 55.80, 37.50, 37.70, limit=100
+        ),
+        "search_organizations_by_name": lambda db: crud.search_organizations_by_name(db, "Рога", limit=100),
+        "search_organizations_by_name_ranked": lambda db: crud.search_organizations_by_name(
+            db, "Рога", limit=100, ranked=True
+        ),
+        "serialize_organization_page_1000": lambda db: to_json(
+            schemas.OrganizationPage, crud.get_organizations_by_activity(db, 1, limit=1000)
+        ),
+    }
+
+
+def fixture_key(organizations, buildings):
+    """Хэш всего, от чего зависит содержимое базы: аргументы seed_dataset, код генератора и схема таблиц"""
+    arguments = inspect.signature(seed_dataset).bind(None, organizations, buildings)
+    arguments.apply_defaults()
+    arguments = {name: value for name, value in arguments.arguments.items() if name not in ("db_engine", "log")}
+    schema = [str(CreateTable(table).compile(dialect=sqlite.dialect())) for table in models.Base.metadata.sorted_tables]
+    digest = hashlib.sha256()
+    for part in (json.dumps(arguments, sort_keys=True), inspect.getsource(seed_database), *schema):
+        digest.update(part.encode())
+    return digest.hexdigest()[:12]
+
+
+def prepare_fixture(size, fixture_dir):
+    """Движок SQLite с набором данных размера size; база создается один раз для каждого ключа fixture_key"""
+    organizations, buildings = SIZES[size]
+    path = os.path.join(fixture_dir, f"crud_benchmark_{size}_{fixture_key(organizations, buildings)}.db")
+    db_engine = create_engine(f"sqlite:///{path}")
+    if not os.path.exists(path + ".ready"):
+        # Наборы этого размера от прежних параметров или схемы больше не нужны
+        for stale in glob.glob(os.path.join(fixture_dir, f"crud_benchmark_{size}[._]*")):
+            os.remove(stale)
+        print(f"Создание набора {size} в {path}...")
+        models.Base.metadata.create_all(bind=db_engine)
+        seed_dataset(db_engine, organizations, buildings, log=lambda message: None)
+        open(path + ".ready", "w").close()
+    instrument_engine(db_engine)
+
+    # Индексы в памяти строятся так же, как при старте приложения
+    with db_engine.begin() as connection:
+        search.ensure_sqlite_fts(connection)
+    with Session(db_engine) as db:
+        building_index.rebuild(db)
+        activity_closure.rebuild(db)
+    return db_engine
+
+
+def measure(db_engine, fn, repeats):
+    """Время (мс), число SQL-запросов и пиковая память (КБ) одного вызова"""
+    with Session(db_engine) as db:
+        fn(db)  # прогрев: кэш страниц SQLite и подготовленные выражения
+
+    timings = []
+    for _ in range(repeats):
+        with Session(db_engine) as db:
+            with track_queries() as stats:
+                start = time.perf_counter()
+                fn(db)
+                timings.append(time.perf_counter() - start)
+
+    # Память меряется отдельным вызовом: tracemalloc замедляет выполнение
+    with Session(db_engine) as db:
+        tracemalloc.start()
+        try:
+            fn(db)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+    return {
+        "time_ms_min": round(min(timings) * 1000, 3),
+        "time_ms_median": round(statistics.median(timings) * 1000, 3),
+        "queries": stats.count,
+        "peak_memory_kb": round(peak / 1024, 1),
+    }
+
+
+def compare(baseline, results, time_threshold, memory_threshold):
+    """Регрессии относительно базового прогона: запросы - строго, время и память - с порогом в %"""
+    regressions = []
+    for size, cases in results.items():
+        for name, current in cases.items():
+            before = baseline.get(size, {}).get(name)
+            if before is None:
+                continue
+            if current["queries"] > before["queries"]:
+                regressions.append(f"{size} {name}: SQL-запросов {before['queries']} -> {current['queries']}")
+            if current["time_ms_median"] > before["time_ms_median"] * (1 + time_threshold / 100):
+                regressions.append(
+                    f"{size} {name}: время {before['time_ms_median']} -> {current['time_ms_median']} мс"
+                )
+            if current["peak_memory_kb"] > before["peak_memory_kb"] * (1 + memory_threshold / 100):
+                regressions.append(
+                    f"{size} {name}: память {before['peak_memory_kb']} -> {current['peak_memory_kb']} КБ"
+                )
+    return regressions
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Микробенчмарки crud-функций")
+    parser.add_argument("--sizes", default="1k,10k", help=f"Размеры наборов через запятую: {', '.join(SIZES)}")
+    parser.add_argument("--cases", help="Только эти функции (через запятую)")
+    parser.add_argument("--repeats", type=int, default=5, help="Повторов каждого замера")
+    parser.add_argument("--fixture-dir", default=os.path.join(tempfile.gettempdir(), "crud_benchmark"),
+                        help="Каталог баз с наборами данных")
+    parser.add_argument("--baseline", help="JSON базового прогона для сравнения")
+    parser.add_argument("--save-baseline", help="Сохранить результаты как базовый прогон")
+    parser.add_argument("--time-threshold", type=float, default=50, help="Допустимый рост времени, %%")
+    parser.add_argument("--memory-threshold", type=float, default=25, help="Допустимый рост пиковой памяти, %%")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    sizes = [size.strip() for size in args.sizes.split(",")]
+    cases = benchmark_cases()
+    if args.cases:
+        selected = {name.strip() for name in args.cases.split(",")}
+        cases = {name: fn for name, fn in cases.items() if name in selected}
+    os.makedirs(args.fixture_dir, exist_ok=True)
+
+    print("=== Бенчмарк crud-функций ===\n")
+    results = {}
+    for size in sizes:
+        db_engine = prepare_fixture(size, args.fixture_dir)
+        print(f"\nНабор {size} ({SIZES[size][0]:,} организаций, {SIZES[size][1]:,} зданий)")
+        print(f"{'функция':<42}{'мин, мс':>10}{'медиана':>10}{'запросов':>10}{'память, КБ':>12}")
+        results[size] = {}
+        for name, fn in cases.items():
+            result = measure(db_engine, fn, args.repeats)
+            results[size][name] = result
+            print(f"{name:<42}{result['time_ms_min']:>10}{result['time_ms_median']:>10}"
+                  f"{result['queries']:>10}{result['peak_memory_kb']:>12}")
+        db_engine.dispose()
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2, sort_keys=True)
+        print(f"\n📁 Базовый прогон сохранен в {args.save_baseline}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(baseline, results, args.time_threshold, args.memory_threshold)
+        print(f"\n=== Сравнение с {args.baseline} ===")
+        for regression in regressions:
+            print(f"❌ {regression}")
+        if regressions:
+            print(f"\nРегрессий: {len(regressions)}")
+            sys.exit(1)
+        print("✅ Регрессий нет")
+
+
+if __name__ == "__main__":
+    main()
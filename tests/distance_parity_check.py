@@ -0,0 +1,121 @@
+"""
+Сверка векторного расчета расстояний (NumPy) со скалярной формулой Haversine
+
+crud.calculate_distances должен давать те же расстояния, что и
+crud.calculate_distance, в том числе у полюсов, через антимеридиан и на
+маленьких наборах (меньше VECTORIZE_MIN_SIZE точек - скалярный путь).
+
+    python distance_parity_check.py
+"""
+
+import os
+import random
+import sys
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ.setdefault("DB_MODE", "sync")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import crud
+
+# Допустимое расхождение, км: порядок ошибки округления float64 на радиусе Земли
+TOLERANCE_KM = 1e-9
+SEED = 42
+
+
+def max_difference(origin, points):
+    """Наибольшее расхождение векторного и скалярного расчета для набора точек"""
+    latitudes = [lat for lat, _ in points]
+    longitudes = [lon for _, lon in points]
+    vectorized = crud.calculate_distances(*origin, latitudes, longitudes)
+    assert len(vectorized) == len(points)
+    return max(
+        abs(distance - crud.calculate_distance(*origin, lat, lon))
+        for distance, (lat, lon) in zip(vectorized, points)
+    )
+
+
+def random_points(rnd, count, lat_range=(-90, 90), lon_range=(-180, 180)):
+    return [(rnd.uniform(*lat_range), rnd.uniform(*lon_range)) for _ in range(count)]
+
+
+def check_random_points():
+    """Случайные точки по всему шару"""
+    rnd = random.Random(SEED)
+    for _ in range(50):
+        origin = random_points(rnd, 1)[0]
+        difference = max_difference(origin, random_points(rnd, 1000))
+        assert difference <= TOLERANCE_KM, f"расхождение {difference} км от {origin}"
+
+
+def check_poles():
+    """Точки у полюсов и сами полюса"""
+    rnd = random.Random(SEED)
+    for pole in (90.0, -90.0):
+        points = random_points(rnd, 500, lat_range=sorted((pole, pole * 0.99))) + [(pole, 0.0), (pole, 180.0)]
+        for origin in [(pole, 0.0), (pole, -123.4), (pole * 0.999, 45.0)]:
+            difference = max_difference(origin, points)
+            assert difference <= TOLERANCE_KM, f"расхождение {difference} км от {origin}"
+
+
+def check_antimeridian():
+    """Точки по обе стороны антимеридиана"""
+    rnd = random.Random(SEED)
+    points = random_points(rnd, 250, lon_range=(179.0, 180.0)) + random_points(rnd, 250, lon_range=(-180.0, -179.0))
+    for origin in [(0.0, 179.99), (64.7, -179.99), (-45.0, 180.0)]:
+        difference = max_difference(origin, points)
+        assert difference <= TOLERANCE_KM, f"расхождение {difference} км от {origin}"
+        # Через антимеридиан расстояние короткое, а не через полшара
+        assert crud.calculate_distances(origin[0], origin[1], [origin[0]] * 16, [-origin[1]] * 16)[0] < 10
+
+
+def check_small_sets():
+    """Меньше VECTORIZE_MIN_SIZE точек - ровно скалярный результат"""
+    rnd = random.Random(SEED)
+    origin = (55.7558, 37.6176)
+    for count in range(crud.VECTORIZE_MIN_SIZE):
+        points = random_points(rnd, count)
+        distances = crud.calculate_distances(*origin, [lat for lat, _ in points], [lon for _, lon in points])
+        assert distances == [crud.calculate_distance(*origin, lat, lon) for lat, lon in points], count
+
+
+def check_without_numpy():
+    """Без NumPy - скалярный путь на любом размере набора"""
+    rnd = random.Random(SEED)
+    origin = (-33.86, 151.21)
+    points = random_points(rnd, 100)
+    saved, crud.np = crud.np, None
+    try:
+        distances = crud.calculate_distances(*origin, [lat for lat, _ in points], [lon for _, lon in points])
+    finally:
+        crud.np = saved
+    assert distances == [crud.calculate_distance(*origin, lat, lon) for lat, lon in points]
+
+
+CHECKS = [
+    check_random_points,
+    check_poles,
+    check_antimeridian,
+    check_small_sets,
+    check_without_numpy,
+]
+
+
+def main():
+    print("=== Сверка расчета расстояний ===\n")
+    if crud.np is None:
+        print("⚠️ NumPy не установлен: векторный путь не проверяется\n")
+    failures = 0
+    for check in CHECKS:
+        try:
+            check()
+            print(f"✅ {check.__doc__}")
+        except AssertionError as e:
+            failures += 1
+            print(f"❌ {check.__doc__}: {e}")
+    print(f"\nОшибок: {failures}")
+    return failures
+
+
+if __name__ == "__main__":
+    sys.exit(1 if main() else 0)
@@ -0,0 +1,201 @@
+"""
+Проверка инкрементальной синхронизации индексов в памяти (без HTTP и uvicorn)
+
+Строки с меньшим id могут закоммититься позже строк с большим id: параллельные
+транзакции в PostgreSQL или вставки разных воркеров. Индекс должен подхватить
+такие строки при следующей синхронизации, а собственные вставки процесса
+не должны сдвигать границу синхронизации.
+
+    python index_sync_check.py
+"""
+
+import os
+import sys
+import threading
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ.setdefault("DB_MODE", "sync")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import StaticPool
+
+from app import models
+from app.activity_tree import ActivityClosure
+from app.geo_index import BuildingGridIndex
+
+
+def make_engine():
+    db_engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+    models.Base.metadata.create_all(bind=db_engine)
+    return db_engine
+
+
+def insert_buildings(db, *ids):
+    db.execute(insert(models.Building), [
+        {"id": building_id, "address": f"Здание {building_id}", "latitude": 55.75, "longitude": 37.62}
+        for building_id in ids
+    ])
+    db.commit()
+
+
+def insert_activities(db, *rows):
+    """rows - пары (id, parent_id); уровень считается от родителя"""
+    levels = dict(db.query(models.Activity.id, models.Activity.level).all())
+    for activity_id, parent_id in rows:
+        levels[activity_id] = levels[parent_id] + 1 if parent_id else 1
+        db.execute(insert(models.Activity), [
+            {"id": activity_id, "name": f"Деятельность {activity_id}", "parent_id": parent_id, "level": levels[activity_id]}
+        ])
+    db.commit()
+
+
+def force_refresh(index, db):
+    index._refresh.synced_at = float("-inf")
+    index.refresh_if_stale(db)
+
+
+def indexed_buildings(index):
+    return {building_id for building_id, _, _ in index.query_rectangle(-90, 90, -180, 180)}
+
+
+def check_building_index_out_of_order():
+    """Здания, закоммиченные после зданий с большими id, попадают в индекс"""
+    with Session(make_engine()) as db:
+        # 4 и 5 еще не закоммичены другими транзакциями, когда индекс строится
+        insert_buildings(db, 1, 2, 3, 6)
+        index = BuildingGridIndex()
+        index.rebuild(db)
+        assert indexed_buildings(index) == {1, 2, 3, 6}
+
+        # Этот воркер создал здание 10 и сразу добавил его в индекс
+        insert_buildings(db, 10)
+        index.add(10, 55.75, 37.62)
+
+        # Другие воркеры закоммитили 4 (пропуск ниже границы) и 7 (ниже собственной вставки)
+        insert_buildings(db, 4, 7)
+        force_refresh(index, db)
+        assert indexed_buildings(index) == {1, 2, 3, 4, 6, 7, 10}, indexed_buildings(index)
+
+        # Пропуск перечитывается, пока не истечет GAP_RETENTION
+        insert_buildings(db, 5)
+        force_refresh(index, db)
+        assert indexed_buildings(index) == {1, 2, 3, 4, 5, 6, 7, 10}, indexed_buildings(index)
+
+
+def count_concurrent_syncs(index, db):
+    """Сколько синхронизаций запустилось, пока шла первая.
+
+    Во время первой синхронизации индекс догружается повторно из того же
+    потока (как гринлет другого запроса на потоке цикла событий) и из
+    другого потока.
+    """
+    syncs = []
+    sync = index._sync
+
+    def nested_sync(session):
+        syncs.append(session)
+        if len(syncs) == 1:
+            index.refresh_if_stale(session)
+            other = threading.Thread(target=index.refresh_if_stale, args=(session,))
+            other.start()
+            other.join(timeout=5)
+        sync(session)
+
+    index._sync = nested_sync
+    try:
+        force_refresh(index, db)
+    finally:
+        del index._sync
+    return len(syncs) - 1
+
+
+def check_building_refresh_single_flight():
+    """Пока идет догрузка зданий, другие вызовы не запускают вторую"""
+    with Session(make_engine()) as db:
+        insert_buildings(db, 1)
+        index = BuildingGridIndex()
+        index.rebuild(db)
+        insert_buildings(db, 2)
+        assert count_concurrent_syncs(index, db) == 0
+        assert indexed_buildings(index) == {1, 2}, indexed_buildings(index)
+        # После синхронизации следующая догрузка - не раньше REFRESH_INTERVAL
+        insert_buildings(db, 3)
+        index.refresh_if_stale(db)
+        assert indexed_buildings(index) == {1, 2}, indexed_buildings(index)
+
+
+def check_activity_closure_out_of_order():
+    """Деятельности, закоммиченные после деятельностей с большими id, попадают в замыкание"""
+    with Session(make_engine()) as db:
+        insert_activities(db, (1, None), (2, 1), (5, None))
+        closure = ActivityClosure()
+        closure.rebuild(db)
+        assert closure.descendants(1) == {1, 2}
+
+        # Этот воркер создал деятельность 10 и сразу добавил её в замыкание
+        insert_activities(db, (10, 5))
+        closure.add(10, 5, 2)
+
+        # Другие воркеры закоммитили 3 (пропуск ниже границы) и 7 (ниже собственной вставки)
+        insert_activities(db, (3, 2), (7, 1))
+        force_refresh(closure, db)
+        assert closure.descendants(1) == {1, 2, 3, 7}, closure.descendants(1)
+        assert closure.descendants(5) == {5, 10}, closure.descendants(5)
+
+        insert_activities(db, (4, 3))
+        force_refresh(closure, db)
+        assert closure.descendants(1) == {1, 2, 3, 4, 7}, closure.descendants(1)
+        assert closure.ancestors(4) == [4, 3, 2, 1]
+
+
+def check_activity_refresh_single_flight():
+    """Пока идет догрузка деятельностей, другие вызовы не запускают вторую"""
+    with Session(make_engine()) as db:
+        insert_activities(db, (1, None))
+        closure = ActivityClosure()
+        closure.rebuild(db)
+        insert_activities(db, (2, 1))
+        assert count_concurrent_syncs(closure, db) == 0
+        assert closure.descendants(1) == {1, 2}, closure.descendants(1)
+        insert_activities(db, (3, 1))
+        closure.refresh_if_stale(db)
+        assert closure.descendants(1) == {1, 2}, closure.descendants(1)
+
+
+def check_activity_child_before_parent():
+    """Потомок, добавленный раньше родителя, остается в поддеревьях родителя и предков"""
+    closure = ActivityClosure()
+    closure.add(1, None, 1)
+    closure.add(3, 2, 3)
+    closure.add(2, 1, 2)
+    assert closure.descendants(2) == {2, 3}, closure.descendants(2)
+    assert closure.descendants(1) == {1, 2, 3}, closure.descendants(1)
+
+
+CHECKS = [
+    check_building_index_out_of_order,
+    check_building_refresh_single_flight,
+    check_activity_closure_out_of_order,
+    check_activity_refresh_single_flight,
+    check_activity_child_before_parent,
+]
+
+
+def main():
+    print("=== Синхронизация индексов в памяти ===\n")
+    failures = 0
+    for check in CHECKS:
+        try:
+            check()
+            print(f"✅ {check.__doc__}")
+        except AssertionError as e:
+            failures += 1
+            print(f"❌ {check.__doc__}: {e}")
+    print(f"\nОшибок: {failures}")
+    return failures
+
+
+if __name__ == "__main__":
+    sys.exit(1 if main() else 0)
@@ -7,12 +7,10 @@ import time
 import json
 from datetime import datetime
 
-API_KEY = "your-secret-api-key-here"
 BASE_URL = "http://localhost:8000"
-HEADERS = {
-    "Authorization": f"Bearer {API_KEY}",
-    "Content-Type": "application/json"
-}
+# /health и /ready открыты без API ключа и не читают данные справочника,
+# поэтому опрос раз в несколько секунд не нагружает сервис
+TIMEOUT = 5
 
 
 def check_api_health():
@@ -23,56 +21,46 @@ def check_api_health():
         "checks": {}
     }
 
-    # Проверка базового endpoint
+    # Liveness: процесс отвечает
     try:
         start_time = time.time()
-        response = requests.get(f"{BASE_URL}/buildings", headers=HEADERS, timeout=5)
+        response = requests.get(f"{BASE_URL}/health", timeout=TIMEOUT)
         response_time = time.time() - start_time
 
-        checks["checks"]["buildings_endpoint"] = {
+        checks["checks"]["liveness"] = {
             "status": "ok" if response.status_code == 200 else "error",
             "response_time": round(response_time, 3),
             "status_code": response.status_code
         }
     except Exception as e:
-        checks["checks"]["buildings_endpoint"] = {
+        checks["checks"]["liveness"] = {
             "status": "error",
             "error": str(e)
         }
         checks["status"] = "unhealthy"
+        return checks
 
-    # Проверка поиска организаций
+    # Readiness: БД, миграции, пулы соединений и индексы в памяти
     try:
         start_time = time.time()
-        response = requests.get(f"{BASE_URL}/organizations/search/by-name?name=test", headers=HEADERS, timeout=5)
+        response = requests.get(f"{BASE_URL}/ready", timeout=TIMEOUT)
         response_time = time.time() - start_time
+        details = response.json().get("checks", {})
 
-        checks["checks"]["search_endpoint"] = {
+        checks["checks"]["readiness"] = {
             "status": "ok" if response.status_code == 200 else "error",
             "response_time": round(response_time, 3),
             "status_code": response.status_code
         }
+        for name in ("database", "migrations", "caches"):
+            if name in details:
+                checks["checks"][name] = details[name]
+        for engine, pool in details.get("pools", {}).items():
+            checks["checks"][f"pool_{engine}"] = pool
+        if response.status_code != 200:
+            checks["status"] = "unhealthy"
     except Exception as e:
-        checks["checks"]["search_endpoint"] = {
-            "status": "error",
-            "error": str(e)
-        }
-        checks["status"] = "unhealthy"
-
-    # Проверка географического поиска
-    try:
-        start_time = time.time()
-        params = {"latitude": 55.7558, "longitude": 37.6176, "radius": 1}
-        response = requests.get(f"{BASE_URL}/organizations/in-radius", headers=HEADERS, params=params, timeout=5)
-        response_time = time.time() - start_time
-
-        checks["checks"]["geo_search_endpoint"] = {
-            "status": "ok" if response.status_code == 200 else "error",
-            "response_time": round(response_time, 3),
-            "status_code": response.status_code
-        }
-    except Exception as e:
-        checks["checks"]["geo_search_endpoint"] = {
+        checks["checks"]["readiness"] = {
             "status": "error",
             "error": str(e)
         }
@@ -81,7 +69,7 @@ def check_api_health():
     return checks
 
 
-def monitor_continuously(interval=60, duration=300):
+def monitor_continuously(interval=5, duration=300):
     """Непрерывный мониторинг API"""
     print(f"Начинаем мониторинг API каждые {interval} секунд в течение {duration} секунд...")
     print("-" * 80)
@@ -101,14 +89,25 @@ def monitor_continuously(interval=60, duration=300):
         # Детали по каждому check
         for check_name, check_result in health_status["checks"].items():
             check_status = check_result["status"]
-            check_icon = "✅" if check_status == "ok" else "❌"
+            if check_status == "ok":
+                check_icon = "✅"
+            elif check_status in ("unknown", "saturated", "warming"):
+                check_icon = "⚠️"
+            else:
+                check_icon = "❌"
 
             if "response_time" in check_result:
                 response_time = check_result["response_time"]
                 print(f"   {check_icon} {check_name}: {response_time}s")
+            elif "saturation" in check_result:
+                print(f"   {check_icon} {check_name}: занято {check_result['checked_out']}/{check_result['capacity']}")
+            elif "latency_ms" in check_result:
+                print(f"   {check_icon} {check_name}: {check_result['latency_ms']} мс")
             elif "error" in check_result:
                 error = check_result["error"]
                 print(f"   {check_icon} {check_name}: {error}")
+            else:
+                print(f"   {check_icon} {check_name}: {check_status}")
 
         print("-" * 80)
         time.sleep(interval)
@@ -132,7 +131,7 @@ if __name__ == "__main__":
     if len(sys.argv) > 1:
         if sys.argv[1] == "monitor":
             # Непрерывный мониторинг
-            interval = int(sys.argv[2]) if len(sys.argv) > 2 else 60
+            interval = int(sys.argv[2]) if len(sys.argv) > 2 else 5
             duration = int(sys.argv[3]) if len(sys.argv) > 3 else 300
             monitor_continuously(interval, duration)
         elif sys.argv[1] == "report":
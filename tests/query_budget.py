@@ -0,0 +1,67 @@
+"""
+Проверка бюджета SQL-запросов эндпоинтов по заголовку X-DB-Query-Count
+Убедитесь, что приложение запущено с выключенным кэшем ответов и заполнено тестовыми данными:
+
+    RESPONSE_CACHE_ENABLED=false uvicorn app.main:app
+"""
+
+import sys
+import requests
+
+API_KEY = "your-secret-api-key-here"
+BASE_URL = "http://localhost:8000"
+HEADERS = {
+    "Authorization": f"Bearer {API_KEY}",
+}
+
+# Максимальное число SQL-запросов на один ответ (эндпоинт, параметры, бюджет)
+QUERY_BUDGETS = [
+    ("/buildings", {}, 2),
+    ("/organizations/by-building/1", {}, 5),
+    ("/organizations/by-activity/1", {}, 5),
+    ("/organizations/in-radius", {"latitude": 55.7558, "longitude": 37.6176, "radius": 50}, 6),
+    ("/organizations/in-rectangle", {"min_lat": 55.7, "max_lat": 55.8, "min_lon": 37.5, "max_lon": 37.7}, 5),
+    ("/organizations/1", {}, 4),
+    ("/organizations/search/by-name", {"name": "Рога"}, 5),
+    ("/organizations/search/by-name", {"name": "Рога", "ranked": "true"}, 5),
+    ("/organizations/by-activity/1", {"view": "compact"}, 1),
+    ("/organizations/in-radius", {"latitude": 55.7558, "longitude": 37.6176, "radius": 50, "view": "compact"}, 2),
+]
+
+
+def query_count(path, params=None):
+    """Число SQL-запросов, выполненных сервером для ответа.
+
+    Ответ из кэша не обращается к БД и ничего не говорит о бюджете,
+    поэтому сервер должен быть запущен с RESPONSE_CACHE_ENABLED=false.
+    """
+    response = requests.get(f"{BASE_URL}{path}", params=params, headers=HEADERS, timeout=10)
+    response.raise_for_status()
+    if response.headers.get("X-Cache") == "HIT":
+        raise RuntimeError("ответ взят из кэша: запустите сервер с RESPONSE_CACHE_ENABLED=false")
+    return int(response.headers["X-DB-Query-Count"])
+
+
+def assert_max_queries(path, max_queries, params=None):
+    """Падает, если эндпоинт выполнил больше max_queries SQL-запросов"""
+    count = query_count(path, params)
+    assert count <= max_queries, f"{path} {params or ''}: {count} запросов, бюджет {max_queries}"
+    return count
+
+
+def main():
+    print("=== Бюджет SQL-запросов ===\n")
+    failures = 0
+    for path, params, budget in QUERY_BUDGETS:
+        try:
+            count = assert_max_queries(path, budget, params)
+            print(f"✅ {path} {params or ''}: {count}/{budget}")
+        except AssertionError as e:
+            failures += 1
+            print(f"❌ {e}")
+    print(f"\nНарушений бюджета: {failures}")
+    return failures
+
+
+if __name__ == "__main__":
+    sys.exit(1 if main() else 0)
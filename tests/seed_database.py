@@ -0,0 +1,304 @@
+"""
+Генератор синтетического набора данных для нагрузочных тестов и бенчмарков
+Пишет напрямую в БД (PostgreSQL - через COPY, остальные - пакетным INSERT), минуя API
+
+    python seed_database.py --scale 1m --truncate
+    python seed_database.py --buildings 5000 --organizations 200000 --seed 7
+
+Один и тот же seed дает один и тот же набор данных. После загрузки перезапустите
+приложение: индексы в памяти строятся из БД при старте, а кэш ответов сбрасывается
+(ETag - хэш тела ответа и меняется вместе с данными).
+"""
+
+import argparse
+import io
+import math
+import os
+import random
+import sys
+import time
+
+os.environ.setdefault("DB_MODE", "sync")
+# Пакетные вставки всегда дольше порога медленных запросов - не засоряем ими лог
+os.environ.setdefault("SLOW_QUERY_MS", "inf")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from sqlalchemy import text
+
+from app import models, search
+from app.database import engine
+
+# Готовые масштабы: число организаций и зданий
+SCALES = {
+    "10k": {"organizations": 10_000, "buildings": 1_000},
+    "100k": {"organizations": 100_000, "buildings": 10_000},
+    "1m": {"organizations": 1_000_000, "buildings": 100_000},
+    "10m": {"organizations": 10_000_000, "buildings": 1_000_000},
+}
+
+# Центры городов: (название, широта, долгота, вес по населению, радиус застройки в км)
+CITIES = [
+    ("Москва", 55.7558, 37.6176, 13.0, 25),
+    ("Санкт-Петербург", 59.9311, 30.3609, 5.6, 20),
+    ("Новосибирск", 55.0084, 82.9357, 1.6, 15),
+    ("Екатеринбург", 56.8389, 60.6057, 1.5, 15),
+    ("Казань", 55.7961, 49.1064, 1.3, 12),
+    ("Нижний Новгород", 56.2965, 43.9361, 1.2, 12),
+    ("Красноярск", 56.0153, 92.8932, 1.2, 12),
+    ("Самара", 53.1959, 50.1002, 1.1, 12),
+    ("Ростов-на-Дону", 47.2357, 39.7015, 1.1, 12),
+    ("Владивосток", 43.1155, 131.8855, 0.6, 10),
+    ("Калининград", 54.7104, 20.4522, 0.5, 8),
+    ("Мурманск", 68.9585, 33.0827, 0.3, 6),
+]
+# Районов (подцентров застройки) на город и доля зданий вне районов
+DISTRICTS_PER_CITY = 8
+SCATTER_SHARE = 0.15
+
+STREETS = ["Ленина", "Мира", "Гагарина", "Советская", "Пушкина", "Лесная", "Садовая", "Школьная",
+           "Набережная", "Центральная", "Молодежная", "Заводская", "Победы", "Кирова", "Блюхера"]
+ORG_PREFIXES = ["ООО", "АО", "ИП", "ПАО", "ЗАО"]
+ORG_WORDS = ["Рога", "Копыта", "Альфа", "Вектор", "Север", "Юг", "Гранит", "Радуга", "Орион", "Меридиан",
+             "Сфера", "Техно", "Строй", "Торг", "Сервис", "Маркет", "Логистик", "Авто", "Фуд", "Софт"]
+ACTIVITY_WORDS = ["Еда", "Автомобили", "IT", "Строительство", "Медицина", "Образование", "Торговля",
+                  "Транспорт", "Финансы", "Спорт", "Туризм", "Производство", "Связь", "Сельское хозяйство"]
+
+KM_PER_DEGREE = 111.32
+
+
+def build_districts(rnd):
+    """Подцентры застройки внутри каждого города"""
+    districts = []
+    for name, latitude, longitude, weight, radius_km in CITIES:
+        for _ in range(DISTRICTS_PER_CITY):
+            lat, lon = offset_point(rnd, latitude, longitude, radius_km / 2)
+            districts.append((name, lat, lon, weight / DISTRICTS_PER_CITY, radius_km / 6, radius_km))
+    return districts
+
+
+def offset_point(rnd, latitude, longitude, sigma_km):
+    """Точка с нормальным смещением вокруг центра (sigma в километрах)"""
+    lat = latitude + rnd.gauss(0, sigma_km) / KM_PER_DEGREE
+    lon = longitude + rnd.gauss(0, sigma_km) / (KM_PER_DEGREE * max(math.cos(math.radians(latitude)), 0.01))
+    return max(min(lat, 90.0), -90.0), (lon + 180.0) % 360.0 - 180.0
+
+
+def generate_buildings(rnd, count):
+    """Здания кластерами вокруг районов городов; часть разбросана по всему городу"""
+    districts = build_districts(rnd)
+    weights = [district[3] for district in districts]
+    for building_id in range(1, count + 1):
+        city, lat, lon, _, district_sigma, city_radius = rnd.choices(districts, weights)[0]
+        if rnd.random() < SCATTER_SHARE:
+            lat, lon = offset_point(rnd, lat, lon, city_radius / 2)
+        else:
+            lat, lon = offset_point(rnd, lat, lon, district_sigma)
+        address = f"г. {city}, ул. {rnd.choice(STREETS)}, {rnd.randint(1, 200)}"
+        yield building_id, address, round(lat, 6), round(lon, 6)
+
+
+def generate_activities(roots, children, grandchildren):
+    """Полные деревья деятельности из 3 уровней: (id, name, parent_id, level)"""
+    activity_id = 0
+    for root in range(roots):
+        activity_id += 1
+        root_id = activity_id
+        root_name = ACTIVITY_WORDS[root % len(ACTIVITY_WORDS)] + (f" {root // len(ACTIVITY_WORDS) + 1}"
+                                                                   if root >= len(ACTIVITY_WORDS) else "")
+        yield root_id, root_name, None, 1
+        for child in range(children):
+            activity_id += 1
+            child_id = activity_id
+            yield child_id, f"{root_name} / {child + 1}", root_id, 2
+            for grandchild in range(grandchildren):
+                activity_id += 1
+                yield activity_id, f"{root_name} / {child + 1} / {grandchild + 1}", child_id, 3
+
+
+def generate_organizations(rnd, count, building_count, activity_ids, min_activities, max_activities):
+    """Организации и их связи с деятельностями: (организация, [activity_id, ...])"""
+    # Популярность деятельностей по закону Ципфа: несколько видов встречаются намного чаще остальных
+    shuffled = list(activity_ids)
+    rnd.shuffle(shuffled)
+    weights = [1 / (rank + 1) for rank in range(len(shuffled))]
+    cumulative = []
+    total = 0.0
+    for weight in weights:
+        total += weight
+        cumulative.append(total)
+
+    for organization_id in range(1, count + 1):
+        name = f"{rnd.choice(ORG_PREFIXES)} {rnd.choice(ORG_WORDS)} {rnd.choice(ORG_WORDS)} {organization_id}"
+        phones = [f"8-{rnd.randint(900, 999)}-{rnd.randint(100, 999)}-{rnd.randint(10, 99)}-{rnd.randint(10, 99)}"
+                  for _ in range(rnd.randint(1, 3))]
+        activities = set()
+        for _ in range(rnd.randint(min_activities, max_activities)):
+            activities.add(rnd.choices(shuffled, cum_weights=cumulative)[0])
+        yield (organization_id, name, phones, rnd.randint(1, building_count)), sorted(activities)
+
+
+def chunked(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class Loader:
+    """Пакетная загрузка строк: COPY для PostgreSQL (psycopg2), INSERT executemany для остальных"""
+
+    def __init__(self, db_engine):
+        self.engine = db_engine
+        self.use_copy = db_engine.dialect.name == "postgresql" and db_engine.dialect.driver == "psycopg2"
+
+    def load(self, table, columns, rows):
+        if not rows:
+            return
+        if self.use_copy:
+            self._copy(table.name, columns, rows)
+        else:
+            with self.engine.begin() as connection:
+                connection.execute(table.insert(), [dict(zip(columns, row)) for row in rows])
+
+    def _copy(self, table_name, columns, rows):
+        buffer = io.StringIO()
+        for row in rows:
+            buffer.write("\t".join(self._copy_value(value) for value in row))
+            buffer.write("\n")
+        buffer.seek(0)
+        connection = self.engine.raw_connection()
+        try:
+            with connection.cursor() as cursor:
+                cursor.copy_expert(f"COPY {table_name} ({', '.join(columns)}) FROM STDIN", buffer)
+            connection.commit()
+        finally:
+            connection.close()
+
+    @staticmethod
+    def _copy_value(value):
+        if value is None:
+            return "\\N"
+        if isinstance(value, list):
+            # Литерал массива PostgreSQL; сгенерированные значения не содержат кавычек и запятых
+            return "{" + ",".join(f'"{item}"' for item in value) + "}"
+        return str(value).replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n")
+
+
+def truncate(db_engine):
+    """Удаляет данные справочника (API ключи не трогаем)"""
+    with db_engine.begin() as connection:
+        if db_engine.dialect.name == "postgresql":
+            connection.execute(text(
+                "TRUNCATE organization_activity, organizations, activities, buildings RESTART IDENTITY"
+            ))
+        else:
+            for table_name in ("organization_activity", "organizations", "activities", "buildings"):
+                connection.execute(text(f"DELETE FROM {table_name}"))
+
+
+def finish(db_engine):
+    """Сдвигает последовательности id после явной вставки id и обновляет статистику планировщика"""
+    with db_engine.begin() as connection:
+        if db_engine.dialect.name == "postgresql":
+            for table_name in ("buildings", "activities", "organizations"):
+                connection.execute(text(
+                    f"SELECT setval(pg_get_serial_sequence('{table_name}', 'id'), "
+                    f"COALESCE((SELECT MAX(id) FROM {table_name}), 1))"
+                ))
+            connection.execute(text("ANALYZE buildings, activities, organizations, organization_activity"))
+        elif db_engine.dialect.name == "sqlite":
+            search.ensure_sqlite_fts(connection)
+            connection.execute(text("ANALYZE"))
+
+
+def report(log, label, count, started):
+    elapsed = time.perf_counter() - started
+    log(f"  {label}: {count:,} за {elapsed:.1f} сек ({count / elapsed if elapsed else 0:,.0f} строк/сек)")
+
+
+def seed_dataset(db_engine, organizations, buildings, seed=42, roots=14, children=6, grandchildren=5,
+                 min_activities=1, max_activities=4, chunk_size=50_000, log=print):
+    """Генерирует набор данных по seed и загружает его в пустые таблицы db_engine"""
+    rnd = random.Random(seed)
+    loader = Loader(db_engine)
+
+    started = time.perf_counter()
+    building_columns = ("id", "address", "latitude", "longitude")
+    for chunk in chunked(generate_buildings(rnd, buildings), chunk_size):
+        loader.load(models.Building.__table__, building_columns, chunk)
+    report(log, "Здания", buildings, started)
+
+    started = time.perf_counter()
+    activities = list(generate_activities(roots, children, grandchildren))
+    loader.load(models.Activity.__table__, ("id", "name", "parent_id", "level"), activities)
+    report(log, "Виды деятельности", len(activities), started)
+
+    started = time.perf_counter()
+    links_total = 0
+    generated = generate_organizations(
+        rnd, organizations, buildings, [activity[0] for activity in activities], min_activities, max_activities
+    )
+    for chunk in chunked(generated, chunk_size):
+        loader.load(models.Organization.__table__, ("id", "name", "phone_numbers", "building_id"),
+                    [organization for organization, _ in chunk])
+        links = [(organization[0], activity_id) for organization, activity_ids in chunk for activity_id in activity_ids]
+        loader.load(models.organization_activity, ("organization_id", "activity_id"), links)
+        links_total += len(links)
+    report(log, "Организации", organizations, started)
+    log(f"  Связей с деятельностями: {links_total:,}")
+
+    started = time.perf_counter()
+    finish(db_engine)
+    log(f"  Последовательности и статистика планировщика: {time.perf_counter() - started:.1f} сек")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Загрузка синтетического набора данных напрямую в БД")
+    parser.add_argument("--scale", choices=sorted(SCALES), help="Готовый масштаб (число организаций и зданий)")
+    parser.add_argument("--organizations", type=int, help="Число организаций")
+    parser.add_argument("--buildings", type=int, help="Число зданий")
+    parser.add_argument("--roots", type=int, default=14, help="Деятельностей 1 уровня")
+    parser.add_argument("--children", type=int, default=6, help="Дочерних деятельностей у каждой 1 уровня")
+    parser.add_argument("--grandchildren", type=int, default=5, help="Дочерних деятельностей у каждой 2 уровня")
+    parser.add_argument("--min-activities", type=int, default=1, help="Минимум деятельностей у организации")
+    parser.add_argument("--max-activities", type=int, default=4, help="Максимум деятельностей у организации")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--chunk-size", type=int, default=50_000, help="Строк в одной пачке загрузки")
+    parser.add_argument("--truncate", action="store_true", help="Очистить таблицы перед загрузкой")
+    args = parser.parse_args()
+
+    scale = SCALES.get(args.scale, SCALES["10k"])
+    args.organizations = args.organizations or scale["organizations"]
+    args.buildings = args.buildings or scale["buildings"]
+    return args
+
+
+def main():
+    args = parse_args()
+
+    print("=== Генерация тестового набора данных ===\n")
+    print(f"БД: {engine.url.render_as_string(hide_password=True)}")
+    print(f"Зданий: {args.buildings:,}, организаций: {args.organizations:,}, seed: {args.seed}\n")
+
+    models.Base.metadata.create_all(bind=engine)
+    with engine.connect() as connection:
+        if connection.execute(text("SELECT 1 FROM organizations LIMIT 1")).first() and not args.truncate:
+            print("❌ Таблицы не пусты: добавьте --truncate, чтобы загрузить набор заново")
+            sys.exit(1)
+    if args.truncate:
+        truncate(engine)
+
+    seed_dataset(
+        engine, args.organizations, args.buildings, seed=args.seed,
+        roots=args.roots, children=args.children, grandchildren=args.grandchildren,
+        min_activities=args.min_activities, max_activities=args.max_activities, chunk_size=args.chunk_size
+    )
+    print("\n✅ Готово. Перезапустите приложение, чтобы перестроить индексы в памяти.")
+
+
+if __name__ == "__main__":
+    main()
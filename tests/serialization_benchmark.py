@@ -0,0 +1,112 @@
+"""
+Бенчмарк сериализации больших ответов: прежний путь FastAPI против прямой сериализации
+"""
+
+import asyncio
+import os
+import random
+import sys
+import time
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+from pydantic import TypeAdapter
+
+from app import models, schemas
+from app.serialization import orjson, to_json
+
+NUM_ORGANIZATIONS = int(os.getenv("BENCH_ITEMS", "10000"))
+REPEATS = int(os.getenv("BENCH_REPEATS", "5"))
+
+
+def build_page(num_organizations):
+    """Страница из ORM-объектов без БД: здания и дерево деятельностей из 3 уровней"""
+    rnd = random.Random(42)
+    activities = []
+    for i in range(5):
+        root = models.Activity(id=len(activities) + 1, name=f"Деятельность {i}", parent_id=None, level=1)
+        activities.append(root)
+        for j in range(3):
+            child = models.Activity(id=len(activities) + 1, name=f"Деятельность {i}.{j}", parent_id=root.id, level=2)
+            root.children.append(child)
+            activities.append(child)
+            for k in range(2):
+                leaf = models.Activity(id=len(activities) + 1, name=f"Деятельность {i}.{j}.{k}",
+                                       parent_id=child.id, level=3)
+                child.children.append(leaf)
+                activities.append(leaf)
+
+    buildings = [
+        models.Building(id=i + 1, address=f"г. Москва, ул. Тестовая, {i + 1}",
+                        latitude=55 + rnd.random(), longitude=37 + rnd.random())
+        for i in range(1000)
+    ]
+    organizations = []
+    for i in range(num_organizations):
+        building = rnd.choice(buildings)
+        organization = models.Organization(
+            id=i + 1, name=f"ООО Организация {i}", phone_numbers=["8-800-555-35-35", "2-222-222"],
+            building_id=building.id
+        )
+        organization.building = building
+        organization.activities = rnd.sample(activities, 3)
+        organizations.append(organization)
+    return {"organizations": organizations, "next_cursor": "WzEwMDAwXQ"}
+
+
+def fastapi_path(page):
+    """Как раньше: валидация в схему в run_db, затем serialize_response и JSONResponse"""
+    model = TypeAdapter(schemas.OrganizationPage).validate_python(page, from_attributes=True)
+    field = create_response_field(name="Response_benchmark", type_=schemas.OrganizationPage)
+    content = asyncio.run(serialize_response(field=field, response_content=model))
+    return JSONResponse(content).body
+
+
+def pydantic_path(page):
+    """Валидация в схему и model_dump_json без повторной валидации"""
+    adapter = TypeAdapter(schemas.OrganizationPage)
+    return adapter.dump_json(adapter.validate_python(page, from_attributes=True))
+
+
+def direct_path(page):
+    """Текущий путь: ORM -> словари -> orjson"""
+    return to_json(schemas.OrganizationPage, page)
+
+
+def measure(fn, page):
+    timings = []
+    body = None
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        body = fn(page)
+        timings.append(time.perf_counter() - start)
+    return min(timings), body
+
+
+def main():
+    print(f"Организаций в ответе: {NUM_ORGANIZATIONS}, повторов: {REPEATS}")
+    if orjson is None:
+        print("orjson не установлен - прямой путь использует pydantic")
+    page = build_page(NUM_ORGANIZATIONS)
+
+    results = {}
+    for name, fn in [("fastapi", fastapi_path), ("pydantic", pydantic_path), ("direct", direct_path)]:
+        results[name] = measure(fn, page)
+
+    # Формат ответа не должен меняться
+    reference = results["fastapi"][1]
+    for name, (_, body) in results.items():
+        assert body == reference, f"{name}: JSON отличается от прежнего"
+
+    baseline = results["fastapi"][0]
+    print(f"Размер ответа: {len(reference) / 1024 / 1024:.1f} МБ")
+    for name, (elapsed, _) in results.items():
+        print(f"{name:>10}: {elapsed * 1000:8.1f} мс  (x{baseline / elapsed:.1f})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+"""
+Сверка прямой сериализации (app/serialization.py) с pydantic-схемами ответа
+
+Словари building_dict / organization_dict / organization_compact_dict должны
+совпадать с model_dump(mode="json") схем, включая порядок ключей, а to_json -
+байт в байт с dump_json pydantic. С прежним ответом FastAPI через response_model
+(jsonable_encoder + JSONResponse) совпадают порядок ключей и значения; запись
+очень малых и больших float отличается (1e-6 вместо 1e-06).
+
+    python serialization_parity_check.py
+"""
+
+import json
+import os
+import sys
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ.setdefault("DB_MODE", "sync")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import StaticPool
+
+from app import crud, models, schemas
+from app.database import type_adapter
+from app.serialization import building_dict, organization_compact_dict, organization_dict, to_json
+
+
+def make_session():
+    db_engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+    models.Base.metadata.create_all(bind=db_engine)
+    db = Session(db_engine)
+    fill(db)
+    return db
+
+
+def fill(db):
+    """Здания с целыми и дробными координатами, дерево деятельности из 3 уровней, организации с разными телефонами"""
+    db.add_all([
+        models.Building(id=1, address='г. Москва, ул. "Ленина" 1, офис 3', latitude=55.7558, longitude=37.6176),
+        models.Building(id=2, address="Новосибирск, Красный проспект, 50", latitude=55, longitude=-83),
+        models.Building(id=3, address="Антимеридиан", latitude=-0.5, longitude=180.0),
+        models.Building(id=4, address="Почти ноль", latitude=0.000001, longitude=-0.00001),
+    ])
+    db.add_all([
+        models.Activity(id=1, name="Еда", parent_id=None, level=1),
+        models.Activity(id=2, name="Мясная продукция", parent_id=1, level=2),
+        models.Activity(id=3, name="Колбасы\tи сосиски", parent_id=2, level=3),
+        models.Activity(id=4, name="Автомобили", parent_id=None, level=1),
+    ])
+    db.flush()
+    organizations = [
+        models.Organization(id=1, name='ООО "Рога и Копыта"', building_id=1,
+                            phone_numbers=["2-222-222", "3-333-333", "8-923-666-13-13"]),
+        models.Organization(id=2, name="Без телефонов и деятельностей", building_id=2, phone_numbers=[]),
+        models.Organization(id=3, name="Emoji 🚗 \\ /  ", building_id=3, phone_numbers=["+7 (800) 555-35-35"]),
+    ]
+    db.add_all(organizations)
+    db.flush()
+    organizations[0].activities = db.query(models.Activity).filter(models.Activity.id.in_([1, 3])).all()
+    organizations[2].activities = db.query(models.Activity).filter(models.Activity.id == 4).all()
+    db.commit()
+
+
+def as_json(value):
+    """JSON с исходным порядком ключей: сравнение учитывает и значения, и порядок"""
+    return json.dumps(value, ensure_ascii=False)
+
+
+def check_organization_dict(db):
+    """organization_dict совпадает с schemas.Organization.model_dump(mode="json")"""
+    page = crud.get_organizations_by_building(db, 1)
+    organizations = page["organizations"]
+    for building_id in (2, 3):
+        organizations += crud.get_organizations_by_building(db, building_id)["organizations"]
+    assert len(organizations) == 3
+    for organization in organizations:
+        expected = schemas.Organization.model_validate(organization).model_dump(mode="json")
+        actual = organization_dict(organization)
+        assert as_json(actual) == as_json(expected), f"организация {organization.id}: {actual} != {expected}"
+
+
+def check_building_dict(db):
+    """building_dict совпадает с schemas.Building.model_dump(mode="json")"""
+    for building in db.query(models.Building).order_by(models.Building.id):
+        expected = schemas.Building.model_validate(building).model_dump(mode="json")
+        actual = building_dict(building)
+        assert as_json(actual) == as_json(expected), f"здание {building.id}: {actual} != {expected}"
+
+
+def check_compact_dict(db):
+    """organization_compact_dict совпадает с schemas.OrganizationCompact.model_dump(mode="json")"""
+    rows = crud.get_organizations_in_rectangle(db, -90, 90, -180, 180, view=crud.COMPACT_VIEW)["organizations"]
+    assert len(rows) == 3
+    for row in rows:
+        expected = schemas.OrganizationCompact.model_validate(row).model_dump(mode="json")
+        actual = organization_compact_dict(row)
+        assert as_json(actual) == as_json(expected), f"организация {row.id}: {actual} != {expected}"
+
+
+def check_to_json_pages(db):
+    """to_json страниц байт в байт равен JSON pydantic-схемы"""
+    cases = [
+        (schemas.OrganizationPage, crud.get_organizations_by_activity(db, 1, limit=1)),
+        (schemas.OrganizationCompactPage, crud.get_organizations_in_rectangle(db, -90, 90, -180, 180, limit=2,
+                                                                              view=crud.COMPACT_VIEW)),
+        (schemas.BuildingPage, crud.get_buildings(db)),
+        (schemas.Organization, crud.get_organization_by_id(db, 3)),
+    ]
+    for response_model, value in cases:
+        adapter = type_adapter(response_model)
+        expected = adapter.dump_json(adapter.validate_python(value, from_attributes=True))
+        actual = to_json(response_model, value)
+        assert actual == expected, f"{response_model.__name__}: {actual!r} != {expected!r}"
+
+
+def check_fastapi_response(db):
+    """to_json по значениям и порядку ключей равен прежнему ответу FastAPI"""
+    cases = [
+        (schemas.OrganizationPage, crud.get_organizations_by_building(db, 1)),
+        (schemas.OrganizationCompactPage, crud.get_organizations_in_rectangle(db, -90, 90, -180, 180,
+                                                                              view=crud.COMPACT_VIEW)),
+        (schemas.BuildingPage, crud.get_buildings(db)),
+    ]
+    for response_model, value in cases:
+        adapter = type_adapter(response_model)
+        expected = JSONResponse(jsonable_encoder(adapter.validate_python(value, from_attributes=True))).body
+        actual = to_json(response_model, value)
+        assert as_json(json.loads(actual)) == as_json(json.loads(expected)), \
+            f"{response_model.__name__}: {actual!r} != {expected!r}"
+
+
+def check_null_phone_numbers(db):
+    """NULL в phone_numbers сериализуется как пустой список, а не роняет ответ"""
+    organization = crud.get_organization_by_id(db, 2)
+    organization.phone_numbers = None
+    try:
+        assert organization_dict(organization)["phone_numbers"] == []
+    finally:
+        db.rollback()
+
+
+CHECKS = [
+    check_organization_dict,
+    check_building_dict,
+    check_compact_dict,
+    check_to_json_pages,
+    check_fastapi_response,
+    check_null_phone_numbers,
+]
+
+
+def main():
+    print("=== Сверка прямой сериализации со схемами ответа ===\n")
+    failures = 0
+    with make_session() as db:
+        for check in CHECKS:
+            try:
+                check(db)
+                print(f"✅ {check.__doc__}")
+            except AssertionError as e:
+                failures += 1
+                print(f"❌ {check.__doc__}: {e}")
+    print(f"\nОшибок: {failures}")
+    return failures
+
+
+if __name__ == "__main__":
+    sys.exit(1 if main() else 0)
@@ -1,115 +1,283 @@
 """
-Простой stress test для API
+Нагрузочный тест API с открытым циклом (open loop)
+
+Запросы отправляются с постоянной частотой независимо от того, успел ли сервер
+ответить на предыдущие, поэтому медленный сервер не снижает нагрузку на себя.
+Задержка считается от запланированного момента отправки: ожидание свободного
+соединения тоже входит в неё (без coordinated omission).
+
+    python stress_test.py --rate 200 --duration 60 --warmup 10 --output result.json
+    python stress_test.py --rate 200 --duration 60 --compare result.json
+
+Требуется httpx.
 """
 
-import requests
-import threading
+import argparse
+import asyncio
+import json
+import random
+import sys
 import time
-from concurrent.futures import ThreadPoolExecutor
-import statistics
+from collections import Counter, defaultdict
+from datetime import datetime
+
+import httpx
 
 API_KEY = "your-secret-api-key-here"
 BASE_URL = "http://localhost:8000"
-HEADERS = {
-    "Authorization": f"Bearer {API_KEY}",
-    "Content-Type": "application/json"
-}
-
-
-def make_request(endpoint):
-    """Выполняет один запрос и возвращает время выполнения"""
-    start_time = time.time()
-    try:
-        response = requests.get(f"{BASE_URL}{endpoint}", headers=HEADERS, timeout=10)
-        end_time = time.time()
-        return {
-            'success': response.status_code == 200,
-            'time': end_time - start_time,
-            'status_code': response.status_code
-        }
-    except Exception as e:
-        end_time = time.time()
-        return {
-            'success': False,
-            'time': end_time - start_time,
-            'error': str(e)
-        }
 
+# Смесь эндпоинтов по умолчанию: имя, путь, параметры, вес
+DEFAULT_MIX = [
+    {"name": "buildings", "path": "/buildings", "params": {}, "weight": 1},
+    {"name": "by-building", "path": "/organizations/by-building/1", "params": {}, "weight": 2},
+    {"name": "by-activity", "path": "/organizations/by-activity/1", "params": {}, "weight": 2},
+    {"name": "search", "path": "/organizations/search/by-name", "params": {"name": "компания"}, "weight": 2},
+    {"name": "in-radius", "path": "/organizations/in-radius",
+     "params": {"latitude": 55.7558, "longitude": 37.6176, "radius": 10}, "weight": 2},
+    {"name": "organization", "path": "/organizations/1", "params": {}, "weight": 1},
+]
+
+PERCENTILES = [("p50", 50), ("p95", 95), ("p99", 99), ("p99.9", 99.9)]
+
+
+def percentile(sorted_values, pct):
+    """Процентиль по методу ближайшего ранга"""
+    if not sorted_values:
+        return None
+    rank = max(int(len(sorted_values) * pct / 100 + 0.999999) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+def latency_summary(latencies):
+    """Процентили, среднее и максимум задержки в миллисекундах"""
+    values = sorted(latency * 1000 for latency in latencies)
+    summary = {name: percentile(values, pct) for name, pct in PERCENTILES}
+    summary["mean"] = sum(values) / len(values) if values else None
+    summary["max"] = values[-1] if values else None
+    return {name: round(value, 3) if value is not None else None for name, value in summary.items()}
+
+
+class LoadResults:
+    """Результаты измеряемой части прогона по эндпоинтам"""
+
+    def __init__(self):
+        self.latencies = defaultdict(list)       # от запланированного момента до ответа
+        self.service_times = defaultdict(list)   # от фактической отправки до ответа
+        self.errors = defaultdict(Counter)
+        self.requests = Counter()
 
-def stress_test(endpoint, num_requests=100, num_threads=10):
-    """Выполняет stress test для конкретного endpoint"""
-    print(f"Тестирование {endpoint} - {num_requests} запросов в {num_threads} потоков")
+    def record(self, name, latency, service_time, error=None):
+        self.requests[name] += 1
+        if error is None:
+            self.latencies[name].append(latency)
+            self.service_times[name].append(service_time)
+        else:
+            self.errors[name][error] += 1
 
-    start_time = time.time()
-    results = []
 
-    with ThreadPoolExecutor(max_workers=num_threads) as executor:
-        futures = [executor.submit(make_request, endpoint) for _ in range(num_requests)]
-        results = [future.result() for future in futures]
+async def fire(client, semaphore, endpoint, scheduled, results, recording):
+    """Отправляет один запрос, дождавшись свободного слота конкурентности"""
+    async with semaphore:
+        sent = time.perf_counter()
+        error = None
+        try:
+            response = await client.get(endpoint["path"], params=endpoint["params"])
+            # Тело читается целиком: время передачи ответа тоже входит в задержку
+            if response.status_code >= 400:
+                error = f"HTTP {response.status_code}"
+        except httpx.HTTPError as e:
+            error = type(e).__name__
+        finished = time.perf_counter()
+    if recording:
+        results.record(endpoint["name"], finished - scheduled, finished - sent, error)
 
-    end_time = time.time()
-    total_time = end_time - start_time
 
-    # Анализ результатов
-    successful_requests = [r for r in results if r['success']]
-    failed_requests = [r for r in results if not r['success']]
+async def run_load(args, mix):
+    """Генерирует запросы с частотой args.rate в течение warmup + duration секунд"""
+    results = LoadResults()
+    rnd = random.Random(args.seed)
+    weights = [endpoint["weight"] for endpoint in mix]
+    semaphore = asyncio.Semaphore(args.concurrency)
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    headers = {"Authorization": f"Bearer {args.api_key}"}
 
-    if successful_requests:
-        response_times = [r['time'] for r in successful_requests]
-        avg_response_time = statistics.mean(response_times)
-        min_response_time = min(response_times)
-        max_response_time = max(response_times)
-        median_response_time = statistics.median(response_times)
+    async with httpx.AsyncClient(base_url=args.base_url, headers=headers, limits=limits,
+                                 timeout=args.timeout) as client:
+        tasks = set()
+        start = time.perf_counter()
+        warmup_end = start + args.warmup
+        end = warmup_end + args.duration
+        scheduled = start
+        max_lag = 0.0
+        sent = 0
 
-        print(f"  ✅ Успешных запросов: {len(successful_requests)}/{num_requests}")
-        print(f"  ⏱️ Общее время: {total_time:.2f} сек")
-        print(f"  📊 RPS (запросов/сек): {num_requests / total_time:.2f}")
-        print(f"  📈 Среднее время ответа: {avg_response_time:.3f} сек")
-        print(f"  📈 Медианное время ответа: {median_response_time:.3f} сек")
-        print(f"  📈 Мин/Макс время ответа: {min_response_time:.3f}/{max_response_time:.3f} сек")
+        while scheduled < end:
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            else:
+                # Генератор не успевает за расписанием - результаты будут занижать нагрузку
+                max_lag = max(max_lag, -delay)
+            endpoint = rnd.choices(mix, weights)[0]
+            task = asyncio.create_task(
+                fire(client, semaphore, endpoint, scheduled, results, recording=scheduled >= warmup_end)
+            )
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+            sent += 1
+            if args.arrival == "poisson":
+                scheduled += rnd.expovariate(args.rate)
+            else:
+                scheduled += 1 / args.rate
 
-    if failed_requests:
-        print(f"  ❌ Неудачных запросов: {len(failed_requests)}")
-        error_types = {}
-        for req in failed_requests:
-            error = req.get('error', f"HTTP {req.get('status_code', 'Unknown')}")
-            error_types[error] = error_types.get(error, 0) + 1
+        if tasks:
+            await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - warmup_end
 
-        for error, count in error_types.items():
-            print(f"     {error}: {count}")
+    return results, {"sent": sent, "max_schedule_lag_ms": round(max_lag * 1000, 3), "elapsed": elapsed}
 
+
+def build_report(args, mix, results, run_info):
+    """JSON-отчет прогона: ключи отсортированы, чтобы отчеты удобно сравнивать diff-ом"""
+    endpoints = {}
+    all_latencies, all_service_times, all_errors = [], [], Counter()
+    for endpoint in mix:
+        name = endpoint["name"]
+        latencies = results.latencies[name]
+        all_latencies.extend(latencies)
+        all_service_times.extend(results.service_times[name])
+        all_errors.update(results.errors[name])
+        endpoints[name] = {
+            "requests": results.requests[name],
+            "errors": dict(results.errors[name]),
+            "error_rate": round(sum(results.errors[name].values()) / results.requests[name], 5)
+            if results.requests[name] else 0.0,
+            "latency_ms": latency_summary(latencies),
+            "service_time_ms": latency_summary(results.service_times[name]),
+        }
+
+    total_requests = sum(results.requests.values())
+    return {
+        "started_at": datetime.now().isoformat(timespec="seconds"),
+        "config": {
+            "base_url": args.base_url,
+            "rate": args.rate,
+            "arrival": args.arrival,
+            "duration": args.duration,
+            "warmup": args.warmup,
+            "concurrency": args.concurrency,
+            "timeout": args.timeout,
+            "seed": args.seed,
+            "mix": mix,
+        },
+        "summary": {
+            "requests": total_requests,
+            "achieved_rate": round(total_requests / run_info["elapsed"], 3) if run_info["elapsed"] else None,
+            "errors": dict(all_errors),
+            "error_rate": round(sum(all_errors.values()) / total_requests, 5) if total_requests else 0.0,
+            "latency_ms": latency_summary(all_latencies),
+            "service_time_ms": latency_summary(all_service_times),
+            "max_schedule_lag_ms": run_info["max_schedule_lag_ms"],
+        },
+        "endpoints": endpoints,
+    }
+
+
+def print_report(report):
+    summary = report["summary"]
+    print(f"Запросов: {summary['requests']}, фактическая частота: {summary['achieved_rate']} запросов/сек")
+    print(f"Ошибок: {sum(summary['errors'].values())} ({summary['error_rate'] * 100:.2f}%)")
+    if summary["max_schedule_lag_ms"] > 10:
+        print(f"⚠️ Генератор отставал от расписания до {summary['max_schedule_lag_ms']} мс - снизьте --rate")
     print()
+    header = f"{'эндпоинт':<16}{'запросов':>10}{'ошибок':>8}" + "".join(f"{name:>10}" for name, _ in PERCENTILES)
+    print(header + f"{'max':>10}")
+    rows = list(report["endpoints"].items()) + [("ИТОГО", summary)]
+    for name, data in rows:
+        latency = data["latency_ms"]
+        errors = sum(data["errors"].values())
+        line = f"{name:<16}{data['requests']:>10}{errors:>8}"
+        line += "".join(f"{latency[p] if latency[p] is not None else '-':>10}" for p, _ in PERCENTILES)
+        print(line + f"{latency['max'] if latency['max'] is not None else '-':>10}")
+        for error, count in data["errors"].items():
+            print(f"{'':<16}  {error}: {count}")
+    print("\nЗадержки в мс от запланированного момента отправки")
+
+
+def compare_reports(baseline, report, threshold):
+    """Сравнивает процентили с прошлым прогоном; возвращает число регрессий больше threshold %"""
+    regressions = 0
+    print(f"\n=== Сравнение с базовым прогоном ({baseline.get('started_at')}) ===")
+    rows = [("ИТОГО", baseline["summary"], report["summary"])]
+    rows += [
+        (name, baseline["endpoints"][name], data)
+        for name, data in report["endpoints"].items() if name in baseline.get("endpoints", {})
+    ]
+    for name, old, new in rows:
+        for p, _ in PERCENTILES:
+            before, after = old["latency_ms"].get(p), new["latency_ms"].get(p)
+            if not before or after is None:
+                continue
+            change = (after - before) / before * 100
+            marker = ""
+            if change > threshold:
+                marker = " ❌"
+                regressions += 1
+            print(f"{name:<16}{p:>7}: {before:>10.3f} -> {after:>10.3f} мс ({change:+.1f}%){marker}")
+        if new["error_rate"] > old["error_rate"]:
+            regressions += 1
+            print(f"{name:<16} ошибки: {old['error_rate']:.5f} -> {new['error_rate']:.5f} ❌")
+    print(f"Регрессий больше {threshold}%: {regressions}")
+    return regressions
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Нагрузочный тест API с постоянной частотой запросов")
+    parser.add_argument("--base-url", default=BASE_URL)
+    parser.add_argument("--api-key", default=API_KEY)
+    parser.add_argument("--rate", type=float, default=50, help="Запросов в секунду")
+    parser.add_argument("--arrival", choices=["constant", "poisson"], default="constant",
+                        help="Постоянные интервалы или пуассоновский поток")
+    parser.add_argument("--duration", type=float, default=30, help="Длительность измерения, сек")
+    parser.add_argument("--warmup", type=float, default=5, help="Прогрев без учета результатов, сек")
+    parser.add_argument("--concurrency", type=int, default=100, help="Максимум одновременных запросов")
+    parser.add_argument("--timeout", type=float, default=10, help="Таймаут запроса, сек")
+    parser.add_argument("--seed", type=int, default=42, help="Seed выбора эндпоинтов")
+    parser.add_argument("--mix", help="JSON-файл со смесью эндпоинтов (формат как DEFAULT_MIX)")
+    parser.add_argument("--output", help="Куда записать JSON с результатами")
+    parser.add_argument("--compare", help="JSON прошлого прогона для поиска регрессий")
+    parser.add_argument("--threshold", type=float, default=10, help="Допустимый рост процентилей, %%")
+    return parser.parse_args()
 
 
 def main():
+    args = parse_args()
+    mix = DEFAULT_MIX
+    if args.mix:
+        with open(args.mix, encoding="utf-8") as f:
+            mix = json.load(f)
+
     print("=== Stress Test для Organizations API ===\n")
+    print(f"Частота: {args.rate} запросов/сек ({args.arrival}), прогрев {args.warmup} сек, "
+          f"измерение {args.duration} сек, конкурентность {args.concurrency}\n")
 
-    # Проверяем доступность API
-    try:
-        response = requests.get(f"{BASE_URL}/buildings", headers=HEADERS, timeout=5)
-        if response.status_code != 200:
-            print(f"❌ API недоступен. Статус: {response.status_code}")
-            return
-    except Exception as e:
-        print(f"❌ Не удается подключиться к API: {e}")
-        return
-
-    print("✅ API доступен, начинаем тестирование...\n")
-
-    # Тестируем разные endpoints
-    endpoints_to_test = [
-        "/buildings",
-        "/organizations/by-building/1",
-        "/organizations/by-activity/1",
-        "/organizations/search/by-name?name=компания",
-        "/organizations/in-radius?latitude=55.7558&longitude=37.6176&radius=10"
-    ]
+    results, run_info = asyncio.run(run_load(args, mix))
+    report = build_report(args, mix, results, run_info)
+    print_report(report)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2, sort_keys=True)
+        print(f"\n📁 Результаты сохранены в {args.output}")
 
-    for endpoint in endpoints_to_test:
-        stress_test(endpoint, num_requests=50, num_threads=5)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if compare_reports(baseline, report, args.threshold):
+            sys.exit(1)
 
-    print("🏁 Stress test завершен!")
+    print("\n🏁 Stress test завершен!")
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()